@@ -0,0 +1,248 @@
+import os, sys, subprocess
+import argparse
+import json
+import shutil
+import stat
+import tempfile
+import time
+import wave
+import numpy as np
+
+'''
+Throughput benchmark for the acquisition scripts on synthetic corpora.
+
+Generates experiment directories laid out like the real ones (sine-plus-noise
+.ch1.wav files, Praat TextGrids with phone and word tiers, stim.txt), runs
+nasalcoda-vc-cleanup.py, suzhou-cog-process.py and pshf-prep.py on them end to
+end with stubs for ifcformant and PSHF on the PATH, and reports files/sec, tokens/sec and
+peak RSS of each run, so versions can be compared without participant data.
+Caches are disabled, so every run does the full work.
+
+Peak RSS is the largest resident set of the script or any of its worker
+processes (from wait4; Unix only).
+
+Usage: python benchmark.py [--pipelines suzhou nasalcoda pshf] [--subjects N]
+	[--tokens N] [--duration SEC] [--jobs N] [--workdir DIR] [--json FILE]
+  --subjects: number of subject directories per pipeline
+  --tokens: acquisitions (one target word each) per subject
+  --duration: length of each recording in seconds
+  --jobs: passed on to the scripts
+  --workdir: keep the corpora and outputs here instead of a temporary directory
+'''
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+PIPELINES = ["suzhou", "nasalcoda", "pshf"]
+
+fs = 22050
+
+# target words and their phones: suzhou and pshf corpora
+sz_words = [("SIZ", ["S", "IY1"]), ("XIZ", ["SH", "IY1"]), ("SZ", ["S", "IH1"]),
+			("SZW", ["S", "IH1"]), ("XYZ", ["SH", "IY1"]), ("SUW", ["S", "UW1"])]
+# ...and nasalcoda corpora (word, phones ending in a VC)
+nc_words = [("xin", ["x", "i1", "n"]), ("ming", ["m", "i2", "ng"]), ("bin", ["b", "i4", "n"])]
+
+# stand-in for ifcformant: a track of the right layout at 5 ms steps
+STUB_IFCFORMANT = '''#!{python}
+import sys, wave
+out = [a for a in sys.argv if a.startswith("--output=")][0][len("--output="):]
+w = wave.open(sys.argv[-1])
+dur = w.getnframes() / float(w.getframerate())
+with open(out, "w") as f:
+	f.write("sec rms f0 f1 f2 f3\\n")
+	for i in range(int(dur / 0.005)):
+		f.write("%0.5f %0.5f %0.5f %0.5f %0.5f %0.5f\\n" % (i * 0.005, 0.1, 120. + i % 7, 500. + i % 11, 1500., 2500.))
+'''
+
+# stand-in for PSHF: copies the input WAV to the voiced/unvoiced outputs
+STUB_PSHF = '''#!{python}
+import sys, shutil
+f0_file, wav_file, out_prefix = sys.argv[-3:]
+for part in ("_v.wav", "_u.wav"):
+	shutil.copy(wav_file, out_prefix + part)
+'''
+
+def write_wav(path, duration, rng):
+	'''Harmonic 120 Hz tone plus noise, 16-bit mono.'''
+	t = np.arange(int(duration * fs)) / float(fs)
+	x = sum(np.sin(2 * np.pi * 120. * h * t) / h for h in range(1, 6)) * 0.1
+	x += rng.standard_normal(len(t)) * 0.02
+	with wave.open(path, "wb") as w:
+		w.setnchannels(1)
+		w.setsampwidth(2)
+		w.setframerate(fs)
+		w.writeframes((np.clip(x, -1, 1) * 32767).astype("<i2").tobytes())
+
+def write_textgrid(path, tiers, xmax):
+	'''Write a long-format Praat TextGrid; tiers are (name, [(t1, t2, text), ...]).'''
+	out = ['File type = "ooTextFile"', 'Object class = "TextGrid"', '',
+		   'xmin = 0', 'xmax = {}'.format(xmax), 'tiers? <exists>',
+		   'size = {}'.format(len(tiers)), 'item []:']
+	for i, (name, intervals) in enumerate(tiers, 1):
+		out += ['    item [{}]:'.format(i), '        class = "IntervalTier"',
+				'        name = "{}"'.format(name), '        xmin = 0',
+				'        xmax = {}'.format(xmax),
+				'        intervals: size = {}'.format(len(intervals))]
+		for j, (t1, t2, text) in enumerate(intervals, 1):
+			out += ['        intervals [{}]:'.format(j), '            xmin = {}'.format(t1),
+					'            xmax = {}'.format(t2), '            text = "{}"'.format(text)]
+	with open(path, "w") as tg:
+		tg.write("\n".join(out) + "\n")
+
+def word_intervals(word, phones, duration, rng):
+	'''Phone and word intervals for one target word somewhere in the recording.'''
+	seg = 0.12
+	start = round(rng.uniform(0.2, max(0.2, duration - 0.2 - seg * len(phones))), 4)
+	end = round(start + seg * len(phones), 4)
+	phone_ivs = [(0, start, "sil")]
+	phone_ivs += [(round(start + k * seg, 4), round(start + (k + 1) * seg, 4), p) for k, p in enumerate(phones)]
+	phone_ivs.append((end, duration, "sil"))
+	word_ivs = [(0, start, ""), (start, end, word), (end, duration, "")]
+	return phone_ivs, word_ivs
+
+def make_acquisition(acqdir, stim, phone_tier, word_tier, phones, duration, rng):
+	os.makedirs(acqdir)
+	acq = os.path.basename(acqdir)
+	with open(os.path.join(acqdir, "stim.txt"), "w") as st:
+		st.write(stim + "\n")
+	write_wav(os.path.join(acqdir, acq + ".ch1.wav"), duration, rng)
+	phone_ivs, word_ivs = word_intervals(stim.lower() if phone_tier == "phones" else stim, phones, duration, rng)
+	write_textgrid(os.path.join(acqdir, acq + ".ch1.TextGrid"),
+				   [(phone_tier, phone_ivs), (word_tier, word_ivs)], duration)
+
+def make_subject(kind, expdir, tokens, duration, rng):
+	'''Synthetic experiment directory for one subject of the given pipeline.'''
+	for k in range(tokens):
+		acq = "2020-01-01T{:06d}".format(k)
+		if kind == "nasalcoda":
+			word, phones = nc_words[k % len(nc_words)]
+			acqdir = os.path.join(expdir, "cond{}".format(k % 2 + 1), acq)
+			make_acquisition(acqdir, word, "phones", "words", phones, duration, rng)
+		else:
+			word, phones = sz_words[k % len(sz_words)]
+			make_acquisition(os.path.join(expdir, acq), word, "phone", "word", phones, duration, rng)
+
+def install_stub(bindir, name, source):
+	os.makedirs(bindir, exist_ok=True)
+	path = os.path.join(bindir, name)
+	with open(path, "w") as stub:
+		stub.write(source.format(python=sys.executable))
+	os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+def command(kind, expdir, jobs):
+	'''Command line that runs a pipeline on one subject, and its output table.
+
+	expdir is relative to the working directory, as the scripts take the
+	subject number from the digits in it.
+	'''
+	subj = "".join(c for c in expdir if c.isdigit())
+	if kind == "suzhou":
+		args = [os.path.join(here, "suzhou-cog-process.py"), expdir, "--no-audio-cache"]
+		output = os.path.join("cogs_out", "S" + subj + "_cogs.txt")
+	elif kind == "nasalcoda":
+		args = [os.path.join(here, "nasalcoda-vc-cleanup.py"), expdir, "words.txt", "segments.txt",
+				"female", "--no-ifc-cache"]
+		output = os.path.join(expdir, subj + "_formants.txt")
+	else:
+		args = [os.path.join(here, "pshf-prep.py"), expdir, "female", "--no-ifc-cache",
+				"--run-pshf", "--exe", "pshf-stub"]
+		output = expdir + "_pshf.cmd"
+	return [sys.executable] + args + ["--jobs", str(jobs)], output
+
+def count_rows(path, header):
+	if not os.path.exists(path):
+		return 0
+	with open(path) as table:
+		return max(0, sum(1 for line in table if line.strip()) - int(header))
+
+def run_measured(cmd, cwd, env):
+	'''Run cmd; returns wall time (s), peak RSS (MB) and exit status.'''
+	with tempfile.TemporaryFile(mode="w+") as err:
+		t0 = time.perf_counter()
+		proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=err)
+		_, status, usage = os.wait4(proc.pid, 0)
+		seconds = time.perf_counter() - t0
+		proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+		if proc.returncode != 0:
+			err.seek(0)
+			sys.stderr.write(err.read())
+	# ru_maxrss is in kB on Linux, bytes on macOS
+	rss = usage.ru_maxrss / (2.**20 if sys.platform == "darwin" else 2.**10)
+	return seconds, rss, proc.returncode
+
+def bench(kind, root, args, env):
+	'''Generate a corpus for one pipeline, run it on every subject and total the results.'''
+	base = os.path.join(root, kind)
+	os.makedirs(base)
+	if kind == "suzhou":
+		os.makedirs(os.path.join(base, "cogs_out"))
+	elif kind == "nasalcoda":
+		# word and segment lists, given relative to the working directory
+		with open(os.path.join(base, "words.txt"), "w") as words:
+			words.write("".join(w + "\n" for w, _ in nc_words))
+		with open(os.path.join(base, "segments.txt"), "w") as segs:
+			segs.write("i1\ni2\ni4\nn\nng\n")
+	rng = np.random.default_rng(args.seed)
+	res = {'pipeline': kind, 'files': 0, 'tokens': 0, 'seconds': 0., 'peak_rss_mb': 0., 'failed': 0}
+	for s in range(args.subjects):
+		expdir = "subj{}".format(s + 1)
+		make_subject(kind, os.path.join(base, expdir), args.tokens, args.duration, rng)
+		cmd, output = command(kind, expdir, args.jobs)
+		seconds, rss, status = run_measured(cmd, base, env)
+		res['files'] += args.tokens
+		res['tokens'] += count_rows(os.path.join(base, output), header=(kind != "pshf"))
+		res['seconds'] += seconds
+		res['peak_rss_mb'] = max(res['peak_rss_mb'], rss)
+		res['failed'] += int(status != 0)
+	res['files_per_sec'] = res['files'] / res['seconds']
+	res['tokens_per_sec'] = res['tokens'] / res['seconds']
+	return res
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=PIPELINES)
+	parser.add_argument("--subjects", type=int, default=2)
+	parser.add_argument("--tokens", type=int, default=20,
+						help="Acquisitions per subject"
+						)
+	parser.add_argument("--duration", type=float, default=2.0,
+						help="Length of each synthetic recording (s)"
+						)
+	parser.add_argument("--jobs", type=int, default=1)
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--workdir",
+						help="Directory for the corpora and outputs (kept; default: temporary)"
+						)
+	parser.add_argument("--json",
+						help="Also write the results to this file"
+						)
+	args = parser.parse_args()
+
+	if args.workdir:
+		root = args.workdir
+		os.makedirs(root, exist_ok=True)
+		if os.listdir(root):
+			sys.exit("{} is not empty".format(root))
+	else:
+		root = tempfile.mkdtemp(prefix="sigmisc-bench")
+	env = dict(os.environ)
+	install_stub(os.path.join(root, "bin"), "ifcformant", STUB_IFCFORMANT)
+	install_stub(os.path.join(root, "bin"), "pshf-stub", STUB_PSHF)
+	env["PATH"] = os.path.join(root, "bin") + os.pathsep + env.get("PATH", "")
+
+	try:
+		rows = [bench(kind, root, args, env) for kind in args.pipelines]
+	finally:
+		if not args.workdir:
+			shutil.rmtree(root)
+
+	print("{:<10}{:>7}{:>8}{:>10}{:>10}{:>11}{:>10}".format(
+		"pipeline", "files", "tokens", "time (s)", "files/s", "tokens/s", "RSS (MB)"))
+	for res in rows:
+		print("{pipeline:<10}{files:>7}{tokens:>8}{seconds:>10.2f}{files_per_sec:>10.2f}"
+			  "{tokens_per_sec:>11.2f}{peak_rss_mb:>10.1f}".format(**res))
+		if res['failed']:
+			print("  {} of {} runs failed".format(res['failed'], args.subjects))
+	if args.json:
+		with open(args.json, "w") as out:
+			json.dump({'settings': vars(args), 'results': rows}, out, indent=1)
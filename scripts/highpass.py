@@ -0,0 +1,20 @@
+import argparse
+from sigmisc import highpass
+
+'''
+Python port of highpass.praat: high-pass filter every .wav file in a directory
+and output mean intensity in numintervals equal chunks of each target phone.
+
+See sigmisc.highpass for how the values relate to the Praat script's and
+what --check compares.
+
+Usage: python highpass.py [directory] [--log-file _out] [--jobs N] [--check]
+  directory: directory containing .wav files and matching .ch1.TextGrid files
+  --check: compare with the per-interval Praat procedure (--tolerance in dB)
+'''
+
+if __name__ == "__main__":
+	# read in command line arguments
+	parser = argparse.ArgumentParser()
+	highpass.add_arguments(parser)
+	highpass.main(parser.parse_args())
@@ -0,0 +1,9 @@
+'''
+Shared helpers for the sigmisc processing scripts.
+
+The scripts in the parent directory import from this package; running a
+script as `python scripts/<name>.py` puts the scripts directory on the path.
+The pipelines themselves (suzhoucog, nasalcoda, pshfprep, highpass) can
+also be run as `python -m sigmisc [command]` from the scripts directory,
+and several at once in one process with `python -m sigmisc worker`.
+'''
@@ -0,0 +1,85 @@
+import sys
+import argparse
+import importlib
+import shlex
+import traceback
+
+'''
+Single entry point for the sigmisc pipelines.
+
+A command's module (and with it parselmouth, audiolabel and numpy) is only
+imported when the command is run. The worker command runs many command
+lines in one process, so those imports, and the set-up of each pipeline
+module, are paid once rather than once per subject.
+
+Usage: python -m sigmisc [command] [arguments]
+	   python -m sigmisc worker [jobfile]
+  command: one of the commands below; see python -m sigmisc [command] --help
+  worker: run the command lines in jobfile (default: standard input), one per
+	line, e.g. "suzhou-cog S12 --moments sd -j 4"; blank lines and lines
+	starting with # are skipped. Failed jobs are reported and the rest still run.
+'''
+
+# command: (module, description)
+COMMANDS = {
+	'suzhou-cog': ('sigmisc.suzhoucog', "Spectral moments of Suzhou fricatives (suzhou-cog-process.py)"),
+	'corpus': ('sigmisc.corpus', "suzhou-cog, nasalcoda or pshf-prep for every subject under a corpus root, in one task queue"),
+	'nasalcoda': ('sigmisc.nasalcoda', "Final VC stimuli and formants (nasalcoda-vc-cleanup.py)"),
+	'pshf-prep': ('sigmisc.pshfprep', "Segments and f0 files for the PSHF (pshf-prep.py)"),
+	'pshf-run': ('sigmisc.pshf', "Run the PSHF jobs listed by pshf-prep"),
+	'track-compare': ('sigmisc.tracker', "Compare the praat formant/f0 tracker with ifcformant"),
+	'highpass': ('sigmisc.highpass', "High-passed intensity of target phones (highpass.py)"),
+}
+
+def usage():
+	lines = ["usage: python -m sigmisc [command] [arguments]", "",
+			 "commands:"]
+	for name in sorted(COMMANDS):
+		lines.append("  {:<12}{}".format(name, COMMANDS[name][1]))
+	lines.append("  {:<12}{}".format("worker", "Run many command lines in one process"))
+	return "\n".join(lines)
+
+def run_command(argv):
+	'''Run one command line (a list: command name, then its arguments).'''
+	if not argv or argv[0] not in COMMANDS:
+		sys.exit(usage())
+	module = importlib.import_module(COMMANDS[argv[0]][0])
+	parser = argparse.ArgumentParser(prog="python -m sigmisc " + argv[0],
+									 description=COMMANDS[argv[0]][1])
+	module.add_arguments(parser)
+	module.main(parser.parse_args(argv[1:]))
+
+def worker(jobs):
+	'''Run each command line in jobs; returns the number that failed.'''
+	failed = 0
+	for n, line in enumerate(jobs, 1):
+		line = line.strip()
+		if not line or line.startswith("#"):
+			continue
+		print("Job {}: {}".format(n, line))
+		try:
+			run_command(shlex.split(line))
+		except SystemExit as e:
+			if e.code:
+				print("Job {} failed: {}".format(n, e.code), file=sys.stderr)
+				failed += 1
+		except Exception:
+			traceback.print_exc()
+			print("Job {} failed".format(n), file=sys.stderr)
+			failed += 1
+	return failed
+
+if __name__ == "__main__":
+	argv = sys.argv[1:]
+	if not argv or argv[0] in ("-h", "--help"):
+		print(usage())
+	elif argv[0] == "worker":
+		if len(argv) > 1 and argv[1] != "-":
+			with open(argv[1]) as jobfile:
+				failed = worker(jobfile)
+		else:
+			failed = worker(sys.stdin)
+		if failed:
+			sys.exit("{} job(s) failed".format(failed))
+	else:
+		run_command(argv)
@@ -0,0 +1,83 @@
+import os
+import hashlib
+import numpy as np
+import parselmouth
+from sigmisc.cachedir import CacheDir
+from sigmisc.profiling import stage
+
+'''
+Load-once audio cache for acquisition WAV files.
+
+Sounds are keyed by (path, target sampling rate). Only the most recently
+requested acquisition is held in memory, which is all a per-acquisition
+phone loop needs. If a cache directory is given, resampled audio is also
+kept on disk (as compressed .npz, lossless). There is one entry per source
+path and rate, which records the size and mtime of the source: a rerun after
+a TextGrid fix skips resampling entirely, and an entry for a WAV that has
+since changed is overwritten rather than left behind. The cache directory
+is capped at max_bytes, least recently used entries going first.
+'''
+
+class AudioCache(object):
+
+	def __init__(self, cache_dir=None, max_bytes=2**30):
+		self.cache_dir = cache_dir
+		self.disk = CacheDir(cache_dir, max_bytes) if cache_dir is not None else None
+		self._key = None
+		self._sound = None
+
+	def _disk_path(self, wave_file, rate):
+		'''Cache file name for wave_file at rate.'''
+		digest = hashlib.sha1(os.path.abspath(wave_file).encode("utf-8")).hexdigest()[:16]
+		name = os.path.basename(wave_file)
+		return os.path.join(self.cache_dir, "{}.{}.{}.npz".format(name, rate, digest))
+
+	def _load_disk(self, handle, source):
+		'''Cached Sound in handle, or None if it is missing or was made from another version of the source.'''
+		try:
+			with np.load(handle) as npz:
+				if list(npz["source"]) != source:
+					return None
+				sound = parselmouth.Sound(npz["values"],
+										  sampling_frequency=float(npz["fs"]),
+										  start_time=float(npz["xmin"]))
+		except (OSError, KeyError, ValueError):
+			return None
+		self.disk.touch(handle)
+		return sound
+
+	def _save_disk(self, handle, sound, source):
+		self.disk.write(handle, lambda out: np.savez_compressed(
+			out, values=sound.values, fs=sound.sampling_frequency, xmin=sound.xmin, source=source))
+
+	def get(self, wave_file, rate=None):
+		'''Return wave_file as a parselmouth Sound, resampled to rate if given.'''
+		key = (os.path.abspath(wave_file), rate)
+		if key == self._key:
+			return self._sound
+
+		sound = None
+		handle = None
+		if self.cache_dir is not None and rate is not None:
+			handle = self._disk_path(wave_file, rate)
+			st = os.stat(wave_file)
+			source = [st.st_size, st.st_mtime_ns]
+			with stage("load"):
+				sound = self._load_disk(handle, source)
+		if sound is None:
+			with stage("load"):
+				sound = parselmouth.Sound(wave_file)
+			if rate is not None and sound.sampling_frequency != rate:
+				with stage("resample"):
+					sound = sound.resample(rate)
+			if handle is not None:
+				with stage("write"):
+					self._save_disk(handle, sound, source)
+
+		self._key = key
+		self._sound = sound
+		return sound
+
+	def clear(self):
+		self._key = None
+		self._sound = None
@@ -0,0 +1,108 @@
+import os
+import time
+import tempfile
+
+'''
+Size-capped cache directory shared by the on-disk caches (resampled audio,
+ifcformant tracks).
+
+Entries are written through a temporary file and renamed into place, so
+readers never see a partial entry. Temporary files end in TMP_SUFFIX and are
+never evicted while they may still be being written. The directory is
+listed once, on the first write, and after that only when the running size
+total crosses the cap (or every RESCAN_EVERY writes, to pick up what other
+processes added). Eviction removes the least recently used entries until
+the cache is below LOW_WATER of the cap, so a full cache is not listed again
+on the very next write.
+
+Usage:
+	cache = CacheDir('ifc_cache', max_bytes=2**30)
+	cache.write(handle, lambda out: np.savez_compressed(out, track=track))
+	cache.touch(handle)    # on every read
+'''
+
+TMP_SUFFIX = ".part"
+
+# writes between rescans of the directory
+RESCAN_EVERY = 256
+
+# eviction stops at this fraction of max_bytes
+LOW_WATER = 0.9
+
+# temporary files older than this (s) are left over from a crashed writer
+STALE_TMP = 3600
+
+class CacheDir(object):
+
+	def __init__(self, path, max_bytes=2**30, suffix=".npz"):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.suffix = suffix
+		os.makedirs(path, exist_ok=True)
+		self._total = None
+		self._writes = 0
+
+	def touch(self, handle):
+		'''Mark handle as used, for LRU eviction.'''
+		try:
+			os.utime(handle)
+		except OSError:
+			pass
+
+	def write(self, handle, save):
+		'''Write the entry handle with save(file object), replacing it atomically.'''
+		fd, tmp = tempfile.mkstemp(suffix=TMP_SUFFIX, dir=self.path)
+		try:
+			with os.fdopen(fd, "wb") as out:
+				save(out)
+			try:
+				old = os.path.getsize(handle)
+			except OSError:
+				old = 0
+			os.replace(tmp, handle)
+		except BaseException:
+			try:
+				os.remove(tmp)
+			except OSError:
+				pass
+			raise
+		self._writes += 1
+		if self._total is None or self._writes % RESCAN_EVERY == 0:
+			self.evict()
+			return
+		self._total += os.path.getsize(handle) - old
+		if self._total > self.max_bytes:
+			self.evict()
+
+	def evict(self):
+		'''List the cache and remove least recently used entries while it is over max_bytes.'''
+		entries = []
+		total = 0
+		now = time.time()
+		for name in os.listdir(self.path):
+			path = os.path.join(self.path, name)
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			if name.endswith(TMP_SUFFIX):
+				if now - st.st_mtime > STALE_TMP:
+					self._remove(path)
+				continue
+			if not name.endswith(self.suffix):
+				continue
+			entries.append((st.st_mtime, st.st_size, path))
+			total += st.st_size
+		if total > self.max_bytes:
+			entries.sort()
+			while total > LOW_WATER * self.max_bytes and entries:
+				mtime, size, path = entries.pop(0)
+				self._remove(path)
+				total -= size
+		self._total = total
+
+	def _remove(self, path):
+		try:
+			os.remove(path)
+		except OSError:
+			pass
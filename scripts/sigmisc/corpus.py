@@ -0,0 +1,193 @@
+import os, sys
+import time
+import importlib
+from collections import namedtuple
+from functools import partial
+from sigmisc import runner, results, profiling
+
+'''
+Any of the acquisition pipelines (suzhou-cog, nasalcoda, pshf-prep) for
+every subject under a corpus root.
+
+Every directory under the root that holds the pipeline's acquisitions is a
+subject; it is named as the pipeline names its experiment directory (for
+suzhou-cog, S plus the digits of the directory name). All (subject,
+acquisition) pairs go into one task queue, largest WAV file first, and each
+worker takes the next task as soon as it is free, so a subject with long or
+many acquisitions no longer holds up the whole run. Rows are written in
+subject, then acquisition, order whichever task finishes first: to one
+merged table, or with --per-subject to the files the pipeline writes for a
+single subject (cogs_out/[subj]_cogs.txt, [expdir]/[subj]_formants.txt).
+pshf-prep has no table to merge: every subject gets its own .cmd script,
+job list and segment list, written once all its acquisitions are done, and
+--run-pshf runs the jobs of all subjects at the end. Progress and an
+estimate of the time left (from the audio processed so far) go to standard
+error.
+
+A pipeline module provides add_measure_arguments(parser),
+find_acquisitions(expdir), subject_tasks(args, expdir, name),
+table_columns(args) (None if it writes no table), subject_output(args,
+expdir, subj) and, optionally, finish(args, outputs).
+
+Usage: python -m sigmisc corpus [pipeline] [root] [-j N] [--per-subject] [-o merged_file]
+  pipeline: suzhou-cog, nasalcoda or pshf-prep
+  root: directory of experiment directories, one per subject
+  -o: merged output table (default: cogs_out/[root]_cogs.txt for suzhou-cog,
+	[root]/[root]_formants.txt for nasalcoda)
+  measurement options are those of the pipeline
+'''
+
+# pipeline: (module, default merged table, as a format of root and its name)
+PIPELINES = {
+	'suzhou-cog': ('sigmisc.suzhoucog', os.path.join("cogs_out", "{name}_cogs.txt")),
+	'nasalcoda': ('sigmisc.nasalcoda', os.path.join("{root}", "{name}_formants.txt")),
+	'pshf-prep': ('sigmisc.pshfprep', None),
+}
+
+class Task(namedtuple("Task", ["subj", "wave_file", "opts"])):
+	'''One acquisition of one subject, with the subject's process_acquisition options.'''
+	__slots__ = ()
+
+	def __str__(self):
+		return self.wave_file
+
+def find_subjects(root, module):
+	'''Sorted subject directories of root: those containing acquisitions.'''
+	dirs = []
+	for name in sorted(os.listdir(root)):
+		expdir = os.path.join(root, name)
+		if os.path.isdir(expdir) and module.find_acquisitions(expdir):
+			dirs.append(expdir)
+	return dirs
+
+def _measure(process_acquisition, outputs, task):
+	result = process_acquisition(task.opts, task.wave_file)
+	# files written are only needed by an incremental manifest
+	return result[0] if outputs else result
+
+def clock(seconds):
+	seconds = int(round(seconds))
+	return "{:d}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+class Progress(object):
+	'''Tasks done, time elapsed and estimated time left, weighted by task size.'''
+
+	def __init__(self, sizes, out=sys.stderr):
+		self.total = float(sum(sizes)) or 1.
+		self.n_tasks = len(sizes)
+		self.done = 0.
+		self.n = 0
+		self.out = out
+		self.t0 = time.time()
+
+	def update(self, size, label):
+		self.n += 1
+		self.done += size
+		elapsed = time.time() - self.t0
+		left = elapsed * (self.total - self.done) / self.done if self.done else 0.
+		self.out.write("[{}/{}] {} ({} elapsed, ETA {})\n".format(
+			self.n, self.n_tasks, label, clock(elapsed), clock(left)))
+		self.out.flush()
+
+def add_arguments(parser):
+	pipelines = parser.add_subparsers(dest="pipeline", metavar="pipeline",
+									  help="One of: " + ", ".join(sorted(PIPELINES)))
+	pipelines.required = True
+	for name in sorted(PIPELINES):
+		module_name, merged = PIPELINES[name]
+		module = importlib.import_module(module_name)
+		sub = pipelines.add_parser(name, help="{} for every subject".format(name))
+		sub.add_argument("root",
+						 help="Directory of experiment directories, one per subject"
+						 )
+		if merged is not None:
+			sub.add_argument("-o", "--output",
+							 help="Merged output table (default: {})".format(
+								 merged.format(root="[root]", name="[root]"))
+							 )
+			sub.add_argument("--per-subject", action="store_true",
+							 help="Write one table per subject, as {} does, \
+							 instead of a merged table".format(name)
+							 )
+		module.add_measure_arguments(sub)
+		profiling.add_profile_argument(sub)
+		runner.add_jobs_argument(sub)
+
+def main(args):
+	module_name, merged = PIPELINES[args.pipeline]
+	module = importlib.import_module(module_name)
+	root = os.path.normpath(args.root)
+	if not os.path.isdir(root):
+		sys.exit("{} is not a directory".format(root))
+
+	# tasks in output order: subjects, then acquisitions, sorted
+	subjects = []
+	expdirs = {}
+	tasks = []
+	for expdir in find_subjects(root, module):
+		subj, opts, wave_files = module.subject_tasks(args, expdir, os.path.basename(expdir))
+		if subj in expdirs:
+			sys.exit("Two subject directories are both named {} ({})".format(subj, expdir))
+		expdirs[subj] = expdir
+		subjects.append((subj, len(wave_files)))
+		tasks.extend(Task(subj, w, opts) for w in wave_files)
+	if not tasks:
+		sys.exit("No acquisitions found under {}".format(root))
+	print("{} acquisitions of {} subjects".format(len(tasks), len(subjects)))
+
+	columns = module.table_columns(args)
+	merged_file = None
+	if merged is not None:
+		merged_file = results.output_path(args.output or merged.format(
+			root=root, name=os.path.basename(os.path.abspath(root))), args.format)
+
+	# largest acquisitions first, so the last tasks to start are short ones
+	sizes = [os.path.getsize(t.wave_file) for t in tasks]
+	order = sorted(range(len(tasks)), key=lambda i: -sizes[i])
+	progress = Progress(sizes)
+	profiler = profiling.Profiler(enabled=args.profile is not None)
+	measure = partial(_measure, module.process_acquisition, columns is None)
+
+	done = {}
+	left = dict(subjects)
+	outputs = []
+	next_row = 0
+	sink = None
+	if columns is not None and not args.per_subject:
+		sink = results.ResultsSink(merged_file, columns, args.format)
+	else:
+		for subj in [s for s, n in subjects if n == 0]:
+			with module.subject_output(args, expdirs[subj], subj) as out:
+				outputs.append(out)
+	try:
+		for i, rows in profiler.run_unordered(measure, [tasks[i] for i in order], args.jobs):
+			i = order[i]
+			subj, wave_file, _ = tasks[i]
+			done[i] = rows
+			progress.update(sizes[i], "{} {}".format(subj, os.path.basename(os.path.dirname(wave_file))))
+			with profiler.stage("write"):
+				if sink is not None:
+					# the merged table grows as soon as the tasks before are done
+					while next_row in done:
+						sink.write_rows(done.pop(next_row))
+						next_row += 1
+					continue
+				left[subj] -= 1
+				if left[subj] == 0:
+					# a subject's files are written once all its acquisitions are done
+					subj_tasks = [j for j in sorted(done) if tasks[j].subj == subj]
+					with module.subject_output(args, expdirs[subj], subj) as out:
+						for j in subj_tasks:
+							out.write_rows(done.pop(j))
+					outputs.append(out)
+	finally:
+		if sink is not None:
+			sink.close()
+
+	failed = []
+	if hasattr(module, "finish"):
+		with profiler.stage("finish"):
+			failed = module.finish(args, outputs)
+	profiler.report(args.profile or (merged_file or root) + ".profile.json")
+	if failed:
+		sys.exit("{} job(s) failed".format(len(failed)))
@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import audiolabel
+from sigmisc.labels import read_stimfile
+
+'''
+Persistent index of an experiment directory.
+
+A SQLite file holds, for every acquisition, its WAV, TextGrid and stim.txt
+paths and mtimes, the stim, and the intervals of every TextGrid tier. It is
+updated incrementally: only acquisitions whose files changed since the last
+scan are re-read, so finding the acquisitions worth processing no longer
+means opening every stim.txt and parsing every TextGrid.
+
+Usage:
+	index = CorpusIndex(default_path(expdir))
+	index.update(glob.glob(os.path.join(expdir, "*", "*.ch1.wav")))
+	# all S/SH phones inside SIZ/XIZ words
+	for row in index.phones_in_words(phones=["S", "SH"], words=["SIZ", "XIZ"]):
+		print(row["wave_file"], row["phone"], row["t1"], row["t2"], row["word"])
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS acquisitions (
+	id INTEGER PRIMARY KEY,
+	wave_file TEXT UNIQUE NOT NULL,
+	acq TEXT,
+	stim TEXT,
+	tg_file TEXT,
+	wav_mtime INTEGER,
+	tg_mtime INTEGER,
+	stim_mtime INTEGER
+);
+CREATE TABLE IF NOT EXISTS labels (
+	acq_id INTEGER NOT NULL REFERENCES acquisitions(id) ON DELETE CASCADE,
+	tier TEXT NOT NULL,
+	idx INTEGER NOT NULL,
+	t1 REAL,
+	t2 REAL,
+	text TEXT
+);
+CREATE INDEX IF NOT EXISTS labels_tier ON labels (tier, text, acq_id);
+CREATE INDEX IF NOT EXISTS labels_acq ON labels (acq_id, tier, t1);
+'''
+
+def default_path(expdir):
+	return os.path.join(expdir, "corpus_index.sqlite")
+
+def _mtime(path):
+	try:
+		return os.stat(path).st_mtime_ns
+	except OSError:
+		return None
+
+class CorpusIndex(object):
+
+	def __init__(self, db_path):
+		self.db_path = db_path
+		self.conn = sqlite3.connect(db_path)
+		self.conn.row_factory = sqlite3.Row
+		self.conn.execute("PRAGMA foreign_keys = ON")
+		self.conn.executescript(SCHEMA)
+
+	def close(self):
+		self.conn.close()
+
+	def update(self, wave_files):
+		'''Add or refresh the given acquisitions and drop ones whose WAV no longer exists.
+
+		Returns the number of acquisitions that were (re-)read.
+		'''
+		known = {}
+		for row in self.conn.execute("SELECT * FROM acquisitions"):
+			known[row["wave_file"]] = row
+		n = 0
+		with self.conn:
+			for wave_file, row in known.items():
+				if not os.path.exists(wave_file):
+					self.conn.execute("DELETE FROM acquisitions WHERE id = ?", (row["id"],))
+			for wave_file in wave_files:
+				parent = os.path.dirname(wave_file)
+				acq = os.path.split(parent)[1]
+				stimfile = os.path.join(parent, "stim.txt")
+				tg_file = os.path.join(parent, str(acq + ".ch1.TextGrid"))
+				mtimes = (_mtime(wave_file), _mtime(tg_file), _mtime(stimfile))
+				row = known.get(wave_file)
+				if row is not None and (row["wav_mtime"], row["tg_mtime"], row["stim_mtime"]) == mtimes:
+					continue
+				self._add(wave_file, acq, stimfile, tg_file, mtimes)
+				n += 1
+		return n
+
+	def _add(self, wave_file, acq, stimfile, tg_file, mtimes):
+		self.conn.execute("DELETE FROM acquisitions WHERE wave_file = ?", (wave_file,))
+		stim = read_stimfile(stimfile) if mtimes[2] is not None else None
+		cur = self.conn.execute(
+			"INSERT INTO acquisitions (wave_file, acq, stim, tg_file, wav_mtime, tg_mtime, stim_mtime) "
+			"VALUES (?, ?, ?, ?, ?, ?, ?)",
+			(wave_file, acq, stim, tg_file) + mtimes)
+		if mtimes[1] is None:
+			return
+		acq_id = cur.lastrowid
+		tg = audiolabel.LabelManager(from_file=tg_file, from_type='praat')
+		rows = []
+		for tier in tg.names:
+			for idx, lab in enumerate(tg.tier(tier)):
+				t2 = lab.t2 if lab.t2 is not None else lab.t1
+				rows.append((acq_id, tier, idx, lab.t1, t2, lab.text))
+		self.conn.executemany(
+			"INSERT INTO labels (acq_id, tier, idx, t1, t2, text) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+	def acquisitions(self):
+		'''(wave_file, stim) of every indexed acquisition, sorted by wave_file.'''
+		return [(row["wave_file"], row["stim"]) for row in
+				self.conn.execute("SELECT wave_file, stim FROM acquisitions ORDER BY wave_file")]
+
+	def phones_in_words(self, phones=None, words=None, phone_tier='phone', word_tier='word',
+						skip_stims=None):
+		'''Phone intervals whose centre falls in a word interval, optionally filtered by label.
+
+		Rows have wave_file, acq, stim, phone, t1, t2 and word, ordered by
+		acquisition and time.
+		'''
+		sql = ["SELECT a.wave_file, a.acq, a.stim, p.text AS phone, p.t1, p.t2, w.text AS word",
+			   "FROM labels p JOIN acquisitions a ON a.id = p.acq_id",
+			   "JOIN labels w ON w.acq_id = p.acq_id AND w.tier = ?",
+			   "AND w.t1 <= (p.t1 + p.t2) / 2 AND (p.t1 + p.t2) / 2 < w.t2",
+			   "WHERE p.tier = ?"]
+		params = [word_tier, phone_tier]
+		if phones is not None:
+			sql.append("AND p.text IN ({})".format(",".join("?" * len(phones))))
+			params.extend(phones)
+		if words is not None:
+			sql.append("AND w.text IN ({})".format(",".join("?" * len(words))))
+			params.extend(words)
+		if skip_stims is not None:
+			sql.append("AND a.stim NOT IN ({})".format(",".join("?" * len(skip_stims))))
+			params.extend(skip_stims)
+		sql.append("ORDER BY a.wave_file, p.t1")
+		return self.conn.execute(" ".join(sql), params).fetchall()
+
+	def acquisitions_with(self, phones=None, words=None, phone_tier='phone', word_tier='word',
+						  skip_stims=None):
+		'''Sorted wave_files having at least one matching phone-in-word.
+
+		Several scripts (with different globs) can share one index file, so
+		callers should intersect the result with their own acquisitions.
+		'''
+		rows = self.phones_in_words(phones, words, phone_tier, word_tier, skip_stims)
+		return sorted(set(row["wave_file"] for row in rows))
+
+def add_index_argument(parser):
+	parser.add_argument("--index", nargs="?", const="", default=None,
+						help="Use (and update) a corpus index to select acquisitions \
+						(default file: [expdir]/corpus_index.sqlite)"
+						)
+
+def index_from_args(args, expdir):
+	'''CorpusIndex for the --index option, or None.'''
+	if args.index is None:
+		return None
+	return CorpusIndex(args.index or default_path(expdir))
+
+def select_from_args(args, expdir, wave_files, select):
+	'''wave_files narrowed to select(index) with the --index option, or all of them without.
+
+	select takes the (updated) CorpusIndex and returns the wave files to keep.
+	'''
+	index = index_from_args(args, expdir)
+	if index is None:
+		return wave_files
+	index.update(wave_files)
+	hits = set(select(index))
+	index.close()
+	return [w for w in wave_files if w in hits]
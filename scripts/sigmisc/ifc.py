@@ -0,0 +1,179 @@
+import os
+import hashlib
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sigmisc.cachedir import CacheDir
+from sigmisc.intervals import time_slice
+from sigmisc.profiling import stage
+
+'''
+Wrapper around the ifcformant formant/f0 tracker.
+
+Every call writes to its own temporary output file, so any number of calls
+(from threads, worker processes or separate runs in the same directory) can
+run at once. ifcformant's stderr is captured and included in the exception
+raised when it fails.
+
+Output is returned as a NumPy structured array with one float field per
+ifcformant column (sec, f0, f1, f2, f3, ...). With an IfcCache, tracks are
+stored on disk keyed by a hash of the WAV data and the ifcformant arguments,
+so reruns only call ifcformant for segments that actually changed.
+
+Usage:
+	track = run_ifcformant(wave_file, 'female')
+	f1 = track['f1']
+	# several files at once, at most max_workers subprocesses in flight
+	cache = IfcCache('ifc_cache', max_bytes=2**30)
+	for track in run_many(wave_files, 'female', max_workers=4, cache=cache): ...
+'''
+
+# number format ifcformant is asked to print values with
+IFC_FORMAT = '%0.5f'
+
+class IfcformantError(Exception):
+	pass
+
+def ifc_args(speaker, output):
+	return ['ifcformant',
+		   '--speaker=' + speaker,
+		   '-e', 'gain -n -3 sinc -t 10 60 contrast',
+		   '-p ' + IFC_FORMAT,
+		   '--print-header',
+		   '--output=' + output]
+
+def read_table(ifc_file):
+	'''Read an ifcformant table (with header) into a structured array.'''
+	with open(ifc_file, "r") as ifc:
+		names = ifc.readline().split()
+		data = np.loadtxt(ifc, ndmin=2)
+	if data.size == 0:
+		data = np.empty((0, len(names)))
+	track = np.empty(len(data), dtype=[(n, float) for n in names])
+	for col, n in enumerate(names):
+		track[n] = data[:, col]
+	return track
+
+def slice_track(track, t1, t2):
+	'''Samples of track with t1 <= sec < t2, with times made relative to t1.
+
+	Used to cut per-segment tracks out of one run over a whole acquisition;
+	values near the segment edges can differ slightly from a run on the
+	extracted segment alone, since ifcformant sees the surrounding audio.
+	'''
+	seg = track[time_slice(track['sec'], t1, t2, right_closed=False)].copy()
+	seg['sec'] -= t1
+	return seg
+
+def division_means(track, cols, t1, t2, divisions=3):
+	'''Mean of each of cols over each of `divisions` equal parts of t1..t2.
+
+	Returns an array of shape (divisions, len(cols)). All parts are reduced
+	at once from cumulative sums; samples on a boundary count toward both
+	parts it separates, and parts without samples are NaN.
+	'''
+	sec = track['sec']
+	edges = np.linspace(t1, t2, divisions + 1)
+	lo = np.searchsorted(sec, edges[:-1], side='left')
+	hi = np.searchsorted(sec, edges[1:], side='right')
+	vals = np.column_stack([track[c] for c in cols])
+	csum = np.vstack([np.zeros((1, len(cols))), np.cumsum(vals, axis=0)])
+	with np.errstate(invalid="ignore", divide="ignore"):
+		return (csum[hi] - csum[lo]) / (hi - lo)[:, np.newaxis]
+
+class IfcCache(object):
+	'''On-disk cache of ifcformant tracks (.npz) with a size cap and LRU eviction.
+
+	Entries are touched when read, so the least recently used ones are
+	removed first once the cache grows past max_bytes (see CacheDir).
+	'''
+
+	def __init__(self, cache_dir, max_bytes=2**30):
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.disk = CacheDir(cache_dir, max_bytes)
+
+	def key(self, wave_file, args):
+		h = hashlib.sha1()
+		with open(wave_file, "rb") as wav:
+			for block in iter(lambda: wav.read(1 << 20), b""):
+				h.update(block)
+		h.update("\0".join(args).encode("utf-8"))
+		return h.hexdigest()
+
+	def _path(self, key):
+		return os.path.join(self.cache_dir, key + ".npz")
+
+	def get(self, key):
+		handle = self._path(key)
+		try:
+			with np.load(handle) as npz:
+				track = npz["track"]
+		except (OSError, KeyError, ValueError):
+			return None
+		self.disk.touch(handle)
+		return track
+
+	def put(self, key, track):
+		self.disk.write(self._path(key), lambda out: np.savez_compressed(out, track=track))
+
+	def evict(self):
+		'''Remove least recently used entries until the cache is below max_bytes.'''
+		self.disk.evict()
+
+def run_ifcformant(wave_file, speaker, tmpdir=None, cache=None):
+	'''Run ifcformant on wave_file and return its output as a structured array.'''
+	key = None
+	if cache is not None:
+		key = cache.key(wave_file, ifc_args(speaker, ""))
+		track = cache.get(key)
+		if track is not None:
+			return track
+	fd, tempifc = tempfile.mkstemp(suffix=".ifc", prefix="__temp", dir=tmpdir)
+	os.close(fd)
+	try:
+		with stage("subprocess"):
+			proc = subprocess.run(ifc_args(speaker, tempifc) + [wave_file],
+								  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+								  universal_newlines=True)
+		if proc.returncode != 0:
+			raise IfcformantError("ifcformant exited with status {0} on {1}: {2}".format(
+				proc.returncode, wave_file, proc.stderr.strip()))
+		with stage("parse"):
+			track = read_table(tempifc)
+	finally:
+		os.remove(tempifc)
+	if cache is not None:
+		cache.put(key, track)
+	return track
+
+def run_many(wave_files, speaker, max_workers=4, tmpdir=None, cache=None):
+	'''Run ifcformant on each of wave_files, at most max_workers at a time.
+
+	Returns the tracks in the order of wave_files.
+	'''
+	wave_files = list(wave_files)
+	if max_workers <= 1 or len(wave_files) <= 1:
+		return [run_ifcformant(w, speaker, tmpdir, cache) for w in wave_files]
+	with ThreadPoolExecutor(max_workers=max_workers) as pool:
+		return list(pool.map(lambda w: run_ifcformant(w, speaker, tmpdir, cache), wave_files))
+
+def add_cache_arguments(parser):
+	parser.add_argument("--ifc-cache",
+						help="Directory for cached ifcformant tracks \
+						(default: [expdir]_ifc_cache)"
+						)
+	parser.add_argument("--ifc-cache-size", type=float, default=1024,
+						help="Maximum size of the ifcformant cache in MB"
+						)
+	parser.add_argument("--no-ifc-cache", action="store_true",
+						help="Always run ifcformant, don't cache its output"
+						)
+
+def cache_from_args(args, expdir):
+	'''IfcCache for the options added by add_cache_arguments, or None.'''
+	if args.no_ifc_cache:
+		return None
+	cache_dir = args.ifc_cache or str(os.path.normpath(expdir) + "_ifc_cache")
+	return IfcCache(cache_dir, int(args.ifc_cache_size * 2**20))
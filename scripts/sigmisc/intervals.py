@@ -0,0 +1,55 @@
+import numpy as np
+
+'''
+Sorted-array lookups on label tiers and time series.
+
+An IntervalIndex is built once per tier (e.g. the word tier of a TextGrid)
+and answers "which interval is at time t" for any number of times with one
+np.searchsorted call, instead of a linear scan of the tier per query.
+time_slice does the same for the sample times of a track, such as the
+`sec` column of ifcformant output.
+
+Usage:
+	words = IntervalIndex(tg.tier('word'))
+	phones = list(tg.tier('phone'))
+	prons = words.labels_at([f.center for f in phones])  # one pass, Label or None
+	sel = time_slice(track['sec'], t1, t2)  # slice of samples with t1 <= sec <= t2
+'''
+
+class IntervalIndex(object):
+	'''Index over the (sorted, non-overlapping) labels of an interval tier.'''
+
+	def __init__(self, labels):
+		self.labels = list(labels)
+		self.t1 = np.array([lab.t1 for lab in self.labels], dtype=float)
+		self.t2 = np.array([lab.t2 for lab in self.labels], dtype=float)
+
+	def __len__(self):
+		return len(self.labels)
+
+	def indices_at(self, times):
+		'''Index of the interval with t1 <= t < t2 for each of times, or -1.'''
+		times = np.asarray(times, dtype=float)
+		idx = np.searchsorted(self.t1, times, side='right') - 1
+		inside = idx >= 0
+		inside[inside] = times[inside] < self.t2[idx[inside]]
+		return np.where(inside, idx, -1)
+
+	def labels_at(self, times):
+		'''Label at each of times (None where no interval covers it).'''
+		return [self.labels[i] if i >= 0 else None for i in self.indices_at(times)]
+
+	def label_at(self, t):
+		return self.labels_at([t])[0]
+
+	def tslice(self, t1, t2):
+		'''Labels overlapping t1..t2, including those that only touch it at the edges.'''
+		lo = np.searchsorted(self.t2, t1, side='left')
+		hi = np.searchsorted(self.t1, t2, side='right')
+		return self.labels[lo:hi]
+
+def time_slice(times, t1, t2, right_closed=True):
+	'''Slice of the sorted array times covering t1 <= t <= t2 (t < t2 if not right_closed).'''
+	lo = np.searchsorted(times, t1, side='left')
+	hi = np.searchsorted(times, t2, side='right' if right_closed else 'left')
+	return slice(lo, hi)
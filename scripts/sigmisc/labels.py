@@ -0,0 +1,88 @@
+import os
+from collections import namedtuple
+
+'''
+Stimulus and phone-label helpers shared by the Suzhou corpus pipelines.
+
+read_stimfile reads an acquisition's stim.txt. Phone relabelling (IY1 to
+IZ1/YZ1, IH1 to ZZ1/ZW1, ...) and the coarticulation and rounding classes
+come from a rules file (default: suzhou-labels.txt in this package), which
+LabelRules compiles once into a dict keyed by (phone, word). A whole tier is
+then relabelled with one lookup per phone, and a new corpus only needs a new
+rules file.
+
+Usage:
+	stim = read_stimfile(os.path.join(parent, "stim.txt"))
+	rules = LabelRules.from_file()
+	# Rule (label, coart_class, round_class) or None for every phone
+	for f, word, rule in zip(phones, words, rules.rewrite(phones, words)): ...
+'''
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "suzhou-labels.txt")
+
+def read_stimfile(stimfile):
+	with open(stimfile, "r") as stfile:
+		stim = stfile.read().rstrip('\n')
+	return stim
+
+skip_set = ["bolus", "practice", "bite",
+			"BAAE", "AAE", "BUW", "UW", "BIY", "IY", "EU", "FUH", "BUH", "AHR"]
+
+# what a rule rewrites a phone to
+Rule = namedtuple("Rule", ["label", "coart_class", "round_class"])
+
+class LabelRules(object):
+	'''Lookup table from (phone, word) to the Rule for that phone.'''
+
+	def __init__(self, table):
+		self.table = dict(table)
+
+	@classmethod
+	def from_file(cls, path=None):
+		'''Compile a rules file: phone, comma-separated words, label, coart_class, round_class.
+
+		A label of - drops the phone (its Rule has label "").
+		'''
+		path = path or RULES_FILE
+		table = {}
+		with open(path, "r") as rules:
+			for n, line in enumerate(rules, 1):
+				line = line.split("#", 1)[0].strip()
+				if not line:
+					continue
+				fields = line.split("\t")
+				if len(fields) != 5:
+					raise ValueError("{}:{}: expected 5 tab-separated fields, got {}".format(path, n, len(fields)))
+				phone, words, label, coart_class, round_class = [f.strip() for f in fields]
+				rule = Rule("" if label == "-" else label, coart_class, round_class)
+				for word in words.split(","):
+					key = (phone, word.strip())
+					if table.get(key, rule) != rule:
+						raise ValueError("{}:{}: conflicting rules for {} in {}".format(path, n, *key))
+					table[key] = rule
+		return cls(table)
+
+	def phones(self):
+		'''Phone labels (before rewriting) that have a rule.'''
+		return sorted(set(p for p, w in self.table))
+
+	def words(self):
+		return sorted(set(w for p, w in self.table))
+
+	def labels(self):
+		'''Labels after rewriting (except dropped phones).'''
+		return sorted(set(r.label for r in self.table.values() if r.label))
+
+	def lookup(self, phone, word):
+		'''Rule for phone inside word, or None.'''
+		return self.table.get((phone, word))
+
+	def rewrite(self, phones, words):
+		'''Rule (or None) for each of phones, given the word label (or None) at each.'''
+		get = self.table.get
+		return [get((f.text, w.text)) if w is not None else None for f, w in zip(phones, words)]
+
+def add_rules_argument(parser):
+	parser.add_argument("--label-rules",
+						help="Label rewrite rules file (default: suzhou-labels.txt in sigmisc)"
+						)
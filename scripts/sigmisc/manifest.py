@@ -0,0 +1,168 @@
+import os
+import json
+import tempfile
+
+'''
+Per-acquisition manifest for incremental and resumable runs.
+
+The manifest is a JSON file kept next to a script's output. For every
+acquisition it stores the size and mtime of its input files (WAV, TextGrid,
+stim.txt), the output rows it produced and any files it wrote; at the top
+level it stores the settings the run used. An acquisition is reprocessed
+only if one of its inputs changed, and everything is reprocessed if the
+settings changed. Files written for acquisitions that are forgotten
+(settings changed, or the acquisition is gone) are removed with them.
+
+Each recorded acquisition is appended as one JSON line to a journal,
+[manifest].journal, so recording costs the same however many acquisitions
+came before, and an interrupted run picks up where it stopped. The journal
+is folded back into the JSON file when the manifest is opened and when it
+is closed.
+
+Usage:
+	with Manifest(acoustic_file + ".manifest.json", settings) as manifest:
+		todo = [w for w in wave_files if not manifest.is_current(w, acquisition_inputs(w))]
+		for w, rows in zip(todo, runner.run(func, todo, jobs)):
+			manifest.record(w, acquisition_inputs(w), rows)
+		rows = manifest.all_rows(wave_files)
+'''
+
+def acquisition_inputs(wave_file):
+	'''Input files of the acquisition containing wave_file.'''
+	parent = os.path.dirname(wave_file)
+	acq = os.path.split(parent)[1]
+	return [wave_file,
+			os.path.join(parent, "stim.txt"),
+			os.path.join(parent, str(acq + ".ch1.TextGrid"))]
+
+def fingerprint(paths):
+	'''[path, size, mtime_ns] for each of paths; size and mtime are None for missing files.'''
+	fp = []
+	for path in paths:
+		try:
+			st = os.stat(path)
+			fp.append([path, st.st_size, st.st_mtime_ns])
+		except OSError:
+			fp.append([path, None, None])
+	return fp
+
+class Manifest(object):
+
+	def __init__(self, path, settings):
+		self.path = path
+		self.journal_path = path + ".journal"
+		self.settings = settings
+		self.entries = {}
+		self._journal = None
+		if os.path.exists(path):
+			with open(path, "r") as mf:
+				saved = json.load(mf)
+			self.entries = saved.get("acquisitions", {})
+			self._replay()
+			# settings are compared through JSON so tuples and lists agree
+			if saved.get("settings") != json.loads(json.dumps(settings)):
+				# nothing is reused: remove what the old settings wrote
+				for key in self.entries:
+					self.remove_outputs(key)
+				self.entries = {}
+		# start from a compacted file and an empty journal
+		self.save()
+
+	def _replay(self):
+		'''Apply the journal left by a run that was not closed.'''
+		try:
+			with open(self.journal_path, "r") as jf:
+				for line in jf:
+					try:
+						change = json.loads(line)
+					except ValueError:
+						# the last line of a run that was killed mid-write
+						break
+					if "drop" in change:
+						for key in change["drop"]:
+							self.entries.pop(key, None)
+					else:
+						self.entries[change["key"]] = change["entry"]
+		except OSError:
+			pass
+
+	def _append(self, change):
+		if self._journal is None:
+			self._journal = open(self.journal_path, "a")
+		self._journal.write(json.dumps(change) + "\n")
+		self._journal.flush()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def close(self):
+		'''Fold the journal into the manifest file.'''
+		self.save()
+
+	def is_current(self, key, paths):
+		entry = self.entries.get(key)
+		return entry is not None and entry["inputs"] == fingerprint(paths)
+
+	def rows(self, key):
+		return self.entries[key]["rows"]
+
+	def outputs(self, key):
+		'''Files written by the last run of this acquisition (empty if none).'''
+		entry = self.entries.get(key)
+		return entry.get("outputs", []) if entry else []
+
+	def remove_outputs(self, key):
+		'''Remove the files written by the last run of this acquisition.'''
+		for old in self.outputs(key):
+			if os.path.exists(old):
+				os.remove(old)
+
+	def record(self, key, paths, rows, outputs=()):
+		entry = {"inputs": fingerprint(paths),
+				 "rows": list(rows),
+				 "outputs": list(outputs)}
+		self.entries[key] = entry
+		self._append({"key": key, "entry": entry})
+
+	def prune(self, keys):
+		'''Forget acquisitions not in keys (e.g. deleted from the experiment directory) and their files.'''
+		keys = set(keys)
+		drop = [key for key in self.entries if key not in keys]
+		for key in drop:
+			self.remove_outputs(key)
+			del self.entries[key]
+		if drop:
+			self._append({"drop": drop})
+
+	def all_rows(self, keys):
+		'''Rows of all recorded acquisitions among keys, in the order of keys.'''
+		rows = []
+		for key in keys:
+			if key in self.entries:
+				rows.extend(self.entries[key]["rows"])
+		return rows
+
+	def save(self):
+		'''Write all entries to the manifest file and empty the journal.'''
+		if self._journal is not None:
+			self._journal.close()
+			self._journal = None
+		dirname = os.path.dirname(os.path.abspath(self.path))
+		fd, tmp = tempfile.mkstemp(suffix=".json", dir=dirname)
+		with os.fdopen(fd, "w") as mf:
+			json.dump({"settings": self.settings, "acquisitions": self.entries}, mf)
+		os.replace(tmp, self.path)
+		try:
+			os.remove(self.journal_path)
+		except OSError:
+			pass
+
+def add_incremental_argument(parser):
+	parser.add_argument("--incremental", action="store_true",
+						help="Only process acquisitions whose inputs or settings \
+						changed since the last run (or that an interrupted run \
+						didn't reach), reusing stored results for the rest"
+						)
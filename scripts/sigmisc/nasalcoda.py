@@ -0,0 +1,215 @@
+import os, glob, re
+import audiolabel
+import parselmouth
+from functools import partial
+from sigmisc import runner, ifc, tracker, manifest, corpusindex, results, profiling
+from sigmisc.profiling import stage
+from sigmisc.intervals import IntervalIndex
+from sigmisc.labels import read_stimfile
+from sigmisc.segments import WavSegments, add_stream_argument
+from sigmisc.stimuli import StimulusBuilder
+
+'''
+Final-VC stimulus extraction and formant measurement for the nasal coda
+experiment: the nasalcoda command, also run by nasalcoda-vc-cleanup.py.
+
+Usage:
+	parser = argparse.ArgumentParser()
+	add_arguments(parser)
+	main(parser.parse_args(["exp3", "words.txt", "segments.txt", "female"]))
+'''
+
+formants = ['f1', 'f2', 'f3']
+
+def trajectory_cols(divisions):
+	'''Column names for an N-division formant trajectory: F1_1..F1_N, F2_1.., F3_1..'''
+	return ["F{}_{}".format(f[1:], d + 1) for f in formants for d in range(divisions)]
+
+def process_acquisition(opts, wave_file):
+	'''Extract the final VC stimulus of one acquisition and return its output rows.'''
+	rows = []
+	subj = opts['subj']
+	wrds = opts['wrds']
+	word_regexp = opts['word_regexp']
+
+	parent = os.path.dirname(wave_file)
+	condition = os.path.dirname(parent)
+	# skip landmark/practice trials
+	stimfile = os.path.join(parent,"stim.txt") # this is lower-case
+	stim = read_stimfile(stimfile).upper() # makes it upper-case
+
+	if stim.lower() not in wrds:
+		return rows
+
+	# define other files of interest
+	acq = os.path.split(parent)[1]
+	tg_handle = os.path.join(parent,str(acq + ".ch1.TextGrid"))
+	with stage("labels"):
+		tg = audiolabel.LabelManager(from_file=tg_handle,from_type='praat')
+		matches = tg.tier('words').search(word_regexp)
+	if len(matches) > 1:
+		print("Multiple tokens of {} in {}, skipping!".format(stim, acq))
+		return rows
+
+	match = matches[0] # take first item (only item) from the match list
+
+	with stage("labels"):
+		labels = IntervalIndex(tg.tier('phones')).tslice(match.t1, match.t2)
+	# remove intervals surrounding word, which are included in tslice
+	phones = labels[1:-1]
+	# get last two intervals and check
+	vc = phones[-2:]
+	if vc[0].text not in ['i1','i2','i3','i4','i5']:
+		print("{} {}: Final interval is not [i]; skipping!".format(acq, stim))
+		return rows
+	if vc[1].text not in ['n','ng']:
+		print("{} {}: Final interval is not a nasal; skipping!".format(acq, stim))
+		return rows
+
+	print("Now working on {} {}".format(stim,acq))
+
+	start_nonzc = vc[0].t1
+	vowel_end = vc[0].t2
+	end_nonzc = vc[1].t2
+
+	if opts['stream']:
+		# only a padded window around the VC, resampled on its own
+		sound = WavSegments(wave_file).window(start_nonzc, end_nonzc, 44100)
+	else:
+		with stage("load"):
+			sound = parselmouth.Sound(wave_file)
+		with stage("resample"):
+			sound = sound.resample(44100)
+
+	# move timepoints to nearest zero crossings, extract the content of the
+	# two intervals, scale intensity to 70 dB, then pad with 20 ms of silence
+	builder = StimulusBuilder(sound, pad=0.02, intensity=70.)
+	[(start, end)], stims = builder.build([(start_nonzc, end_nonzc)])
+
+	# save the sound file as a stimulus file
+	out_handle = "_".join([subj,stim,acq]) + ".wav"
+	out_path = os.path.join(condition, out_handle)
+	builder.save(stims, [out_path])
+
+	# get IFC object from start to VOWEL's end (the praat tracker uses the stimulus in memory)
+	stim_sound = None
+	if opts['tracker'] == 'praat':
+		stim_sound = parselmouth.Sound(stims[0], sampling_frequency=builder.fs)
+	vc_ifc = tracker.get_track(out_path, opts['speaker'], opts['tracker'], opts['ifc_cache'], sound=stim_sound)
+
+	# mean formants in thirds of the elapsed time in the vowel (set so starts at zero);
+	# rows are thirds, columns F1-F3
+	thirds = ifc.division_means(vc_ifc, formants, 0., vowel_end - start, 3)
+	midF1, midF2, midF3 = thirds[1]
+	endF1, endF2, endF3 = thirds[2]
+	meas = [midF1,endF1,midF2,endF2,midF3,endF3]
+	if opts['divisions']:
+		# N-point trajectory, F1 parts first, then F2, F3
+		traj = ifc.division_means(vc_ifc, formants, 0., vowel_end - start, opts['divisions'])
+		meas.extend(traj.T.ravel())
+
+	# output the data in tabular format
+	out_row = [subj, acq, stim, vc[0].text, vc[1].text] + [float(m) for m in meas]
+	rows.append(out_row)
+	return rows
+
+def find_acquisitions(expdir):
+	return sorted(glob.glob(os.path.join(expdir,"*","*","*.ch1.wav")))
+
+def subject_tasks(args, expdir, name=None):
+	'''Subject name, process_acquisition options and sorted acquisitions to process of expdir.
+
+	The subject is named after the digits of name (default: expdir); only
+	acquisitions of target words are processed.
+	'''
+	with open(args.words, 'r') as mydict:
+		wrds = [line.strip().split()[0].lower() for line in mydict.readlines()]
+	with open(args.segments,'r') as mysegm:
+		segs = [line.strip().split()[0] for line in mysegm.readlines()]
+	word_regexp = re.compile("^({})$".format('|'.join(wrds)))
+	seg_regexp = re.compile("^({})$".format('|'.join(segs)))
+
+	subj = re.sub("[^0-9]", "", name or expdir)
+	opts = {'subj': subj,
+			'wrds': wrds,
+			'word_regexp': word_regexp,
+			'speaker': args.speaker,
+			'divisions': args.divisions,
+			'stream': args.stream,
+			'tracker': args.tracker,
+			'ifc_cache': ifc.cache_from_args(args, expdir)}
+
+	# only acquisitions of target words, without opening every stim.txt
+	wave_files = corpusindex.select_from_args(args, expdir, find_acquisitions(expdir), lambda index: [
+		w for w, stim in index.acquisitions() if stim is not None and stim.lower() in wrds])
+	return subj, opts, wave_files
+
+def subject_file(expdir, subj):
+	return os.path.join(expdir, str(subj + "_formants.txt"))
+
+def table_columns(args):
+	return [(c, str) for c in ["subj","acq","stim","vowel","nasal"]] + \
+		   [(c, float) for c in ["midF1","endF1","midF2","endF2","midF3","endF3"] + trajectory_cols(args.divisions)]
+
+def subject_output(args, expdir, subj):
+	'''Sink for the rows of one subject, [expdir]/[subj]_formants.txt.'''
+	return results.ResultsSink(results.output_path(subject_file(expdir, subj), args.format), table_columns(args), args.format)
+
+def add_measure_arguments(parser):
+	'''Options of the stimuli and formant measurement (shared with the corpus command).'''
+	parser.add_argument("words",
+						help="Plaintext list of target words to be extracted"
+						)
+	parser.add_argument("segments",
+						help="Plaintext list of target segments to be extracted"
+						)
+	parser.add_argument("speaker",
+						help="Required settings to help with formant extraction"
+						)
+	parser.add_argument("--divisions", type=int, default=0,
+						help="Also output mean F1-F3 in this many equal parts of the vowel"
+						)
+	add_stream_argument(parser)
+	tracker.add_tracker_argument(parser)
+	ifc.add_cache_arguments(parser)
+	results.add_format_argument(parser)
+	corpusindex.add_index_argument(parser)
+	# TODO make stimulus output optional
+
+def add_arguments(parser):
+	parser.add_argument("expdir",
+						help="Experiment directory containing \
+						target acq dirs in flat structure"
+						)
+	add_measure_arguments(parser)
+	manifest.add_incremental_argument(parser)
+	profiling.add_profile_argument(parser)
+	runner.add_jobs_argument(parser)
+
+def main(args):
+	expdir = args.expdir
+
+	# acquisitions are processed in sorted order; rows come back in that order
+	# whatever the number of jobs
+	subj, opts, wave_files = subject_tasks(args, expdir)
+	wrds = opts['wrds']
+
+	acoustic_file = subject_file(expdir, subj)
+	columns = table_columns(args)
+	out_file = results.output_path(acoustic_file, args.format)
+
+	profiler = profiling.Profiler(enabled=args.profile is not None)
+
+	done = None
+	if args.incremental:
+		# rerun only what changed, then rebuild the table from the manifest
+		settings = {'subj': subj, 'wrds': wrds, 'speaker': args.speaker, 'divisions': args.divisions,
+					'tracker': args.tracker, 'stream': args.stream, 'columns': [c[0] for c in columns]}
+		done = manifest.Manifest(acoustic_file + ".manifest.json", settings)
+	# rows are buffered and written in batches by this (parent) process
+	with subject_output(args, expdir, subj) as sink:
+		for rows in runner.run_acquisitions(partial(process_acquisition, opts), wave_files, args.jobs,
+											done, profiler.run):
+			with profiler.stage("write"):
+				sink.write_rows(rows)
+	profiler.report(args.profile or out_file + ".profile.json")
@@ -0,0 +1,155 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from functools import partial
+from sigmisc import runner
+
+'''
+Per-stage timing of the acquisition scripts (--profile).
+
+Code that does a distinct kind of work wraps it in stage(), e.g.
+with stage("resample"). Stages are timed only while a task runs under
+Profiler.run, and cost a single check otherwise. Each task's stage times
+and call counts go back to the parent process with its result, so the
+trace covers all acquisitions however many jobs are used. Work done in the
+parent, such as writing the output table, is timed with Profiler.stage.
+
+Stage names used by the scripts: load, resample, labels, extract, spectrum,
+subprocess, parse, formant, pitch, verify, copy, write.
+
+Usage:
+	profiler = Profiler(enabled=args.profile is not None)
+	for rows in profiler.run(partial(process_acquisition, opts), wave_files, args.jobs):
+		with profiler.stage("write"):
+			sink.write_rows(rows)
+	profiler.report(args.profile or acoustic_file + ".profile.json")
+'''
+
+# stage times of the task running in this process (None when not profiling);
+# shared by the threads a task starts, e.g. ifc.run_many
+_current = None
+_lock = threading.Lock()
+
+def _add(record, name, seconds):
+	with _lock:
+		entry = record.setdefault(name, [0., 0])
+		entry[0] += seconds
+		entry[1] += 1
+
+@contextmanager
+def stage(name):
+	'''Time the enclosed block as stage name of the current task.'''
+	record = _current
+	if record is None:
+		yield
+		return
+	t0 = time.perf_counter()
+	try:
+		yield
+	finally:
+		_add(record, name, time.perf_counter() - t0)
+
+def _profiled(func, task):
+	'''Run func(task), returning its result, stage times and total time.'''
+	global _current
+	_current = record = {}
+	t0 = time.perf_counter()
+	try:
+		result = func(task)
+	finally:
+		_current = None
+	return result, record, time.perf_counter() - t0
+
+class Profiler(object):
+
+	def __init__(self, enabled=True):
+		self.enabled = enabled
+		self.tasks = []
+		self.main = {}
+		self.t0 = time.perf_counter()
+
+	def run(self, func, tasks, jobs=1):
+		'''runner.run, recording the stage times of every task if enabled.'''
+		if not self.enabled:
+			for result in runner.run(func, tasks, jobs):
+				yield result
+			return
+		tasks = list(tasks)
+		for task, (result, record, total) in zip(tasks, runner.run(partial(_profiled, func), tasks, jobs)):
+			self.tasks.append({'task': str(task), 'seconds': total, 'stages': record})
+			yield result
+
+	def run_unordered(self, func, tasks, jobs=1):
+		'''runner.run_unordered, recording the stage times of every task if enabled.'''
+		if not self.enabled:
+			for i, result in runner.run_unordered(func, tasks, jobs):
+				yield i, result
+			return
+		tasks = list(tasks)
+		for i, (result, record, total) in runner.run_unordered(partial(_profiled, func), tasks, jobs):
+			self.tasks.append({'task': str(tasks[i]), 'seconds': total, 'stages': record})
+			yield i, result
+
+	@contextmanager
+	def stage(self, name):
+		'''Time a stage of the work done in this (parent) process.'''
+		if not self.enabled:
+			yield
+			return
+		t0 = time.perf_counter()
+		try:
+			yield
+		finally:
+			_add(self.main, name, time.perf_counter() - t0)
+
+	def totals(self):
+		'''{stage: [seconds, calls]} summed over all tasks and the parent process.'''
+		totals = {}
+		for record in [t['stages'] for t in self.tasks] + [self.main]:
+			for name, (seconds, calls) in record.items():
+				entry = totals.setdefault(name, [0., 0])
+				entry[0] += seconds
+				entry[1] += calls
+		return totals
+
+	def summary(self):
+		'''Summary table of stage times, slowest stage first.'''
+		wall = time.perf_counter() - self.t0
+		busy = sum(t['seconds'] for t in self.tasks)
+		lines = ["{:<12}{:>8}{:>12}{:>12}{:>8}".format("stage", "calls", "total (s)", "mean (ms)", "%")]
+		for name, (seconds, calls) in sorted(self.totals().items(), key=lambda s: -s[1][0]):
+			share = 100. * seconds / busy if busy > 0 else 0.
+			lines.append("{:<12}{:>8}{:>12.3f}{:>12.3f}{:>8.1f}".format(
+				name, calls, seconds, 1000. * seconds / calls, share))
+		lines.append("{} tasks, {:.3f} s in tasks, {:.3f} s wall time".format(len(self.tasks), busy, wall))
+		if self.tasks:
+			slowest = max(self.tasks, key=lambda t: t['seconds'])
+			lines.append("slowest task: {} ({:.3f} s)".format(slowest['task'], slowest['seconds']))
+		return "\n".join(lines)
+
+	def save(self, path):
+		'''Write the per-task JSON trace.'''
+		def stages(record):
+			return {name: {'seconds': s, 'calls': c} for name, (s, c) in record.items()}
+		trace = {'wall_seconds': time.perf_counter() - self.t0,
+				 'totals': stages(self.totals()),
+				 'main': stages(self.main),
+				 'tasks': [{'task': t['task'], 'seconds': t['seconds'], 'stages': stages(t['stages'])}
+						   for t in self.tasks]}
+		with open(path, "w") as out:
+			json.dump(trace, out, indent=1)
+
+	def report(self, path):
+		'''Print the summary table and save the trace to path.'''
+		if not self.enabled:
+			return
+		print(self.summary())
+		self.save(path)
+		print("Profile trace written to {}".format(path))
+
+def add_profile_argument(parser):
+	parser.add_argument("--profile", nargs="?", const="", default=None,
+						help="Time each processing stage; print a summary and write a \
+						JSON trace (default file: [output file].profile.json)"
+						)
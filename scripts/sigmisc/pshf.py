@@ -0,0 +1,142 @@
+import os, sys
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sigmisc import manifest
+
+'''
+Runner for Pitch-Scaled Harmonic Filter (PSHF) jobs.
+
+pshf-prep writes one job per segment (f0 file, WAV file, output prefix) to
+[expdir]_pshf_jobs.txt, as well as the Windows .cmd script. This module
+runs those jobs with any PSHF executable, at most `workers` at a time, and
+retries failed ones. A state file, [jobfile].state.json, records every job
+that succeeded and the files it wrote (appended to its journal as each job
+finishes, see manifest). A job is skipped if it succeeded
+before with the same inputs, executable and options, and its outputs still
+exist. An interrupted run can therefore just be started again. Relative
+paths in the job list are relative to the directory pshf-prep was run in.
+
+Usage: python -m sigmisc pshf-run [jobfile] [--exe pshf] [--workers N] [--retries N]
+  jobfile: tab-separated f0 file, WAV file and output prefix per line
+  --exe: PSHF executable (default: pshf on the PATH)
+  --force: rerun jobs even if they already succeeded
+'''
+
+PshfJob = namedtuple("PshfJob", ["f0_file", "wav_file", "out_prefix"])
+
+# options pshf-prep has always given PSHF
+PSHF_OPTIONS = ["-d", "2"]
+
+# the executable the Windows .cmd script runs
+WIN_EXE = ".\\pshf_3.13_win32\\pshf.exe"
+
+def cmd_line(job):
+	'''Line of the Windows .cmd script for job.'''
+	def win(path):
+		return "\\".join(os.path.split(path))
+	return " ".join([WIN_EXE, " ".join(PSHF_OPTIONS), win(job.f0_file), win(job.wav_file), win(job.out_prefix)])
+
+def write_jobs(path, jobs):
+	with open(path, "w") as out:
+		out.write("".join("\t".join(job) + "\n" for job in jobs))
+
+def read_jobs(path):
+	with open(path, "r") as jf:
+		return [PshfJob(*line.rstrip("\n").split("\t")) for line in jf if line.strip()]
+
+def job_outputs(job):
+	'''Files written for job: names starting with its output prefix (but not e.g. prefix_1 for prefix_10).'''
+	out_dir, base = os.path.split(job.out_prefix)
+	try:
+		names = os.listdir(out_dir or ".")
+	except OSError:
+		return []
+	return sorted(os.path.join(out_dir, n) for n in names
+				  if n.startswith(base) and not n[len(base):len(base) + 1].isdigit())
+
+class PshfError(Exception):
+	pass
+
+def run_job(job, exe, options=PSHF_OPTIONS, retries=1):
+	'''Run PSHF on one job, retrying up to retries times; returns the number of attempts.'''
+	for attempt in range(1, retries + 2):
+		proc = subprocess.run([exe] + list(options) + list(job), stdout=subprocess.DEVNULL,
+							  stderr=subprocess.PIPE, universal_newlines=True)
+		if proc.returncode == 0:
+			return attempt
+	raise PshfError("{} exited with status {} on {} ({} attempts): {}".format(
+		exe, proc.returncode, job.wav_file, attempt, proc.stderr.strip()))
+
+def run_jobs(jobs, exe, workers=4, retries=1, state_file=None, force=False, options=PSHF_OPTIONS):
+	'''Run all jobs, at most workers at a time; returns (done, skipped, failed) lists of jobs.'''
+	state = manifest.Manifest(state_file, {'exe': exe, 'options': list(options)}) if state_file else None
+	todo, skipped = [], []
+	for job in jobs:
+		inputs = [job.f0_file, job.wav_file]
+		if (not force and state is not None and state.is_current(job.out_prefix, inputs)
+				and state.outputs(job.out_prefix)
+				and all(os.path.exists(p) for p in state.outputs(job.out_prefix))):
+			skipped.append(job)
+		else:
+			todo.append(job)
+	done, failed = [], []
+	t0 = time.time()
+	try:
+		with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+			futures = {pool.submit(run_job, job, exe, options, retries): job for job in todo}
+			for n, future in enumerate(as_completed(futures), 1):
+				job = futures[future]
+				try:
+					attempts = future.result()
+				except (PshfError, OSError) as e:
+					sys.stderr.write("{}\n".format(e))
+					failed.append(job)
+					continue
+				done.append(job)
+				if state is not None:
+					state.record(job.out_prefix, [job.f0_file, job.wav_file], [], job_outputs(job))
+				print("{}/{} {}{}".format(n, len(todo), job.out_prefix,
+										  " ({} attempts)".format(attempts) if attempts > 1 else ""))
+	finally:
+		# fold the journal into the state file, even if interrupted
+		if state is not None:
+			state.close()
+	print("PSHF: {} done, {} skipped, {} failed in {:.1f} s".format(
+		len(done), len(skipped), len(failed), time.time() - t0))
+	return done, skipped, failed
+
+def add_run_arguments(parser):
+	'''Options for running PSHF jobs (shared by pshf-run and pshf-prep --run-pshf).'''
+	parser.add_argument("--exe", default="pshf",
+						help="PSHF executable"
+						)
+	parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+						help="Number of PSHF processes to run at once"
+						)
+	parser.add_argument("--retries", type=int, default=1,
+						help="Times to retry a failed job"
+						)
+	parser.add_argument("--force", action="store_true",
+						help="Rerun jobs that already succeeded"
+						)
+
+def add_arguments(parser):
+	parser.add_argument("jobfile",
+						help="Job list written by pshf-prep ([expdir]_pshf_jobs.txt)"
+						)
+	add_run_arguments(parser)
+
+def run_from_args(args, jobfile, jobs=None):
+	'''Run the jobs in jobfile (or jobs) with the options of add_run_arguments; returns failed jobs.'''
+	if jobs is None:
+		jobs = read_jobs(jobfile)
+	_, _, failed = run_jobs(jobs, args.exe, args.workers, args.retries,
+							state_file=jobfile + ".state.json", force=args.force)
+	return failed
+
+def main(args):
+	failed = run_from_args(args, args.jobfile)
+	if failed:
+		sys.exit("{} PSHF job(s) failed".format(len(failed)))
@@ -0,0 +1,350 @@
+import os, sys
+import glob
+import shutil
+import audiolabel
+import parselmouth
+from functools import partial
+from sigmisc import runner, ifc, tracker, manifest, corpusindex, profiling, pshf, results
+from sigmisc.profiling import stage
+from sigmisc.intervals import IntervalIndex
+from sigmisc.labels import read_stimfile, skip_set, LabelRules, add_rules_argument
+from sigmisc.segments import WavSegments, add_stream_argument
+
+'''
+Segment extraction and f0 tracking for the Pitch-Scaled Harmonic Filter
+(PSHF) on the Suzhou ultrasound corpus: the pshf-prep command, also run by
+pshf-prep.py.
+
+Every segment is listed, with the acquisition, TextGrid and times it was cut
+from, in [expdir]_pshf_segments.txt. With --staging link, segments and f0
+files are written once, straight into the [label]_in folders, and the
+TextGrids are hard-linked into the [label]_out folders rather than copied.
+
+Usage:
+	parser = argparse.ArgumentParser()
+	add_arguments(parser)
+	main(parser.parse_args(["S12", "female", "-j", "4"]))
+'''
+
+def make_dir(path, clear=True):
+	'''Make an output dir (over-writes it if it already exists, unless clear is False).'''
+	try:
+		os.mkdir(path)
+	except FileExistsError:
+		if clear:
+			shutil.rmtree(path)
+			os.mkdir(path)
+
+# columns of the segment list: the PSHF job, then where the segment came from
+SEGMENT_COLUMNS = ["f0_file", "wav_file", "out_prefix", "label", "source", "textgrid", "t1", "t2"]
+
+def link_file(src, dst):
+	'''Hard-link src as dst (replacing dst), or symlink it, or copy it if neither is possible.'''
+	if os.path.lexists(dst):
+		if os.path.exists(dst) and os.path.samefile(src, dst):
+			return
+		os.remove(dst)
+	try:
+		os.link(src, dst)
+	except OSError:
+		try:
+			os.symlink(os.path.abspath(src), dst)
+		except OSError:
+			shutil.copy(src, dst)
+
+def process_acquisition(opts, wave_file):
+	'''Extract and f0-track the target segments of one acquisition.
+
+	Returns its segments (rows of SEGMENT_COLUMNS) and the files it wrote.
+	'''
+	rows = []
+	outputs = []
+	pshf_dir = opts['pshf_dir']
+	# link staging: segments and f0 files are written straight to the
+	# <seg>_in folders and the TextGrid is linked, instead of copied
+	direct = opts['staging'] == 'link'
+
+	parent = os.path.dirname(wave_file)
+	# skip landmark/practice trials
+	stimfile = os.path.join(parent,"stim.txt")
+	stim = read_stimfile(stimfile)
+
+	# TODO: this block might allow you to simplify below loops
+	if stim in skip_set:
+		return rows, outputs
+
+	# define other files of interest
+	acq = os.path.split(parent)[1]
+	tg_handle = os.path.join(parent,str(acq + ".ch1.TextGrid"))
+	with stage("labels"):
+		tg = audiolabel.LabelManager(from_file=tg_handle,from_type='praat')
+		# look up the word at every phone's center in one pass
+		phones = list(tg.tier('phone'))
+		words = IntervalIndex(tg.tier('word')).labels_at([f.center for f in phones])
+
+	# remove irrelevant labels, relabelling all phones at once
+	rules = opts['rules']
+	target_words = opts['target_words']
+	target_segments = opts['target_segments']
+	for f, word, rule in zip(phones, words, rules.rewrite(phones, words)):
+		# blank silent intervals, and segments not in a word in the target list
+		if f.text == "sp" or f.text == "sil" or word is None or word.text not in target_words:
+			f.text = ""
+			continue
+
+		# ...get phone label, disambiguating IY, IH based on word
+		if rule is not None:
+			f.text = rule.label
+
+		if f.text not in target_segments:
+			continue
+
+		print(acq, '\t', stim, '\t', 'Retained a {}'.format(f.text))
+
+	# trim files with parselmouth
+	name = os.path.splitext((os.path.basename(wave_file)))[0]
+	if opts['stream']:
+		# segments are read straight from the memory-mapped file
+		sound = WavSegments(wave_file)
+	else:
+		with stage("load"):
+			sound = parselmouth.Sound(wave_file)
+	# TODO stop-band filter sound? [sound], 0, 4000, 100
+	matches = tg.tier('phone').search("[^()]")
+	segments = []
+	# the extracted Sounds, tracked in memory by the praat tracker
+	subs = []
+	i = 0
+	for match in matches:
+		i += 1
+		if match.text not in target_segments:
+			continue
+
+		# extract section of wav file and save
+		with stage("extract"):
+			sub = sound.extract_part(from_time = match.t1, to_time = match.t2)
+		if direct:
+			sub_dir = os.path.join(pshf_dir, str(match.text + '_in'))
+		else:
+			sub_dir = parent
+		sub_handle = os.path.join(sub_dir, str(acq + "_" + str(i) + ".wav"))
+		with stage("write"):
+			sub.save(sub_handle, 'WAV')
+		segments.append((match.text, sub_handle, match.t1, match.t2))
+		if opts['tracker'] == 'praat':
+			subs.append(sub)
+
+	if not segments:
+		return rows, outputs
+	if opts['batch_f0']:
+		# run IFCFormant once on the whole acquisition and slice out each segment
+		acq_ifc = tracker.get_track(wave_file, opts['speaker'], opts['tracker'], opts['ifc_cache'],
+									sound=None if opts['stream'] else sound)
+		ifcs = [ifc.slice_track(acq_ifc, s[2], s[3]) for s in segments]
+	else:
+		# run IFCFormant on split files, several at a time
+		ifcs = tracker.get_tracks([s[1] for s in segments], opts['speaker'], opts['tracker'],
+								  opts['ifc_jobs'], cache=opts['ifc_cache'], sounds=subs)
+
+	for (label, sub_handle, t1, t2), seg_ifc in zip(segments, ifcs):
+		sub_acq = os.path.splitext(os.path.split(sub_handle)[1])[0]
+
+		f0_file = os.path.join(os.path.dirname(sub_handle), str(sub_acq + '.f0'))
+		# open the .f0 output file and...
+		with stage("write"), open(f0_file, 'w') as out:
+			# write all f0 samples in f0 column to .f0 file, as ifcformant printed them
+			out.write(''.join('0\n' if f0 == 0. else ifc.IFC_FORMAT % f0 + '\n'
+							  for f0 in seg_ifc['f0']))
+				# for testing, can also write time of sample window
+				#out.write(str(t) + '\t' + ifc.IFC_FORMAT % f0 + '\n')
+
+		# define dirs
+		seg_in_folder = os.path.join(pshf_dir, str(label + '_in'))
+		seg_out_folder = os.path.join(pshf_dir, str(label + '_out'))
+
+		if direct:
+			# already in place; one link to the TextGrid per OUT directory
+			tg_link = os.path.join(seg_out_folder, os.path.basename(tg_handle))
+			with stage("copy"):
+				link_file(tg_handle, tg_link)
+			outputs.extend([sub_handle, f0_file, tg_link])
+		else:
+			# copy files over
+			with stage("copy"):
+				shutil.copy(f0_file, seg_in_folder)
+				shutil.copy(sub_handle, seg_in_folder)
+				shutil.copy(tg_handle, seg_out_folder) # note: TGs are copied to the OUT directory, to use with outputs.
+			outputs.extend([sub_handle, f0_file,
+							os.path.join(seg_in_folder, os.path.basename(sub_handle)),
+							os.path.join(seg_in_folder, os.path.basename(f0_file))])
+		print("Sending {} to {}".format(label, seg_in_folder))
+
+		# the PSHF job for this segment (written to the job list and .cmd file
+		# in order) and where the segment came from
+		rows.append([os.path.join(seg_in_folder, os.path.basename(f0_file)),
+					 os.path.join(seg_in_folder, os.path.basename(sub_handle)),
+					 os.path.join(seg_out_folder, sub_acq),
+					 label, wave_file, tg_handle, repr(t1), repr(t2)])
+	return rows, outputs
+
+def find_acquisitions(expdir):
+	return sorted(glob.glob(os.path.join(expdir,"*","*.ch1.wav")))
+
+def subject_tasks(args, expdir, name=None, clear=True):
+	'''Set up the PSHF folders of expdir; returns its name, process_acquisition options and acquisitions.
+
+	The folders are cleared unless clear is False (when running incrementally).
+	'''
+	try:
+		if not (args.speaker == 'male' or
+				args.speaker == 'female' or
+				args.speaker == 'child'): raise
+		args.speaker != None
+	except:
+		raise Exception('Speaker label must be male, female, or child')
+
+	# make output dir (over-writes if it already exists, unless running incrementally)
+	pshf_dir = str(expdir + '_pshf_in')
+	make_dir(pshf_dir, clear)
+
+	pshf_out = str(expdir + '_pshf_out')
+	make_dir(pshf_out, clear)
+
+	rules = LabelRules.from_file(args.label_rules)
+	target_segments = rules.labels()
+
+	for seg in target_segments:
+		seg_in_folder = os.path.join(pshf_dir, str(seg + '_in'))
+		make_dir(seg_in_folder, clear)
+		seg_out_folder = os.path.join(pshf_dir, str(seg + '_out'))
+		make_dir(seg_out_folder, clear)
+
+	opts = {'pshf_dir': pshf_dir,
+			'speaker': args.speaker,
+			'ifc_jobs': args.ifc_jobs,
+			'batch_f0': args.batch_f0,
+			'tracker': args.tracker,
+			'stream': args.stream,
+			'staging': args.staging,
+			'rules': rules,
+			'target_words': set(rules.words()),
+			'target_segments': set(target_segments),
+			'ifc_cache': ifc.cache_from_args(args, expdir)}
+
+	# only acquisitions with a (not yet disambiguated) target phone inside a target word
+	wave_files = corpusindex.select_from_args(args, expdir, find_acquisitions(expdir),
+		lambda index: index.acquisitions_with(phones=rules.phones(), words=rules.words(), skip_stims=skip_set))
+	return name or os.path.basename(os.path.normpath(expdir)), opts, wave_files
+
+def table_columns(args):
+	# no table to merge: every subject has its own .cmd script and job list
+	return None
+
+class PshfOutput(object):
+	'''The .cmd script, job list and segment list of one subject, written as its rows come in.'''
+
+	def __init__(self, expdir):
+		self.script = str(expdir + '_pshf.cmd')
+		self.jobfile = str(expdir + '_pshf_jobs.txt')
+		# which acquisition, TextGrid and times each segment came from
+		self.segment_list = str(expdir + '_pshf_segments.txt')
+		self.jobs = []
+		self._out = open(self.script, 'w')
+		self._sink = results.ResultsSink(self.segment_list, [(c, str) for c in SEGMENT_COLUMNS])
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def write_rows(self, rows):
+		jobs = [pshf.PshfJob(*row[:3]) for row in rows]
+		# write the PSHF run commands for this acq to the .cmd file
+		self._out.write(''.join(pshf.cmd_line(job) + '\n' for job in jobs))
+		self._sink.write_rows(rows)
+		self.jobs.extend(jobs)
+
+	def close(self):
+		self._out.close()
+		self._sink.close()
+		pshf.write_jobs(self.jobfile, self.jobs)
+
+def subject_output(args, expdir, subj):
+	return PshfOutput(expdir)
+
+def finish(args, outputs):
+	'''Run the jobs of each PshfOutput if --run-pshf was given; returns the jobs that failed.'''
+	failed = []
+	if args.run_pshf:
+		# run PSHF here instead of the .cmd script on Windows
+		for output in outputs:
+			failed.extend(pshf.run_from_args(args, output.jobfile, output.jobs))
+	return failed
+
+def add_measure_arguments(parser):
+	'''Options of the segments and f0 tracking (shared with the corpus command).'''
+	parser.add_argument("speaker",
+						help="Voice information for pitch estimation"
+						)
+	parser.add_argument("--ifc-jobs", type=int, default=4,
+						help="Number of ifcformant processes to run at once \
+						for each acquisition"
+						)
+	parser.add_argument("--batch-f0", action="store_true",
+						help="Track f0 once per acquisition and slice it per \
+						segment, instead of one ifcformant run per segment"
+						)
+	tracker.add_tracker_argument(parser)
+	ifc.add_cache_arguments(parser)
+	add_rules_argument(parser)
+	add_stream_argument(parser)
+	corpusindex.add_index_argument(parser)
+	parser.add_argument("--staging", choices=["copy", "link"], default="copy",
+						help="copy: write segments next to the acquisition and copy them \
+						to the PSHF folders; link: write them to the PSHF folders \
+						once and hard-link (or symlink) the TextGrids"
+						)
+	parser.add_argument("--run-pshf", action="store_true",
+						help="Run the PSHF jobs after preparing them (see the options below)"
+						)
+	pshf.add_run_arguments(parser)
+
+def add_arguments(parser):
+	parser.add_argument("expdir",
+						help="Experiment directory containing \
+						acquisitions in flat structure"
+						)
+	add_measure_arguments(parser)
+	manifest.add_incremental_argument(parser)
+	profiling.add_profile_argument(parser)
+	runner.add_jobs_argument(parser)
+
+def main(args):
+	expdir = args.expdir
+	name, opts, wave_files = subject_tasks(args, expdir, clear=not args.incremental)
+	rules = opts['rules']
+
+	profiler = profiling.Profiler(enabled=args.profile is not None)
+
+	# loop through available .wav files; acquisitions are processed in sorted
+	# order and their commands come back in that order whatever the number of jobs
+	output = PshfOutput(expdir)
+	done = None
+	if args.incremental:
+		# rerun only what changed (removing its old segments), then rebuild the .cmd file from the manifest
+		settings = {'pshf_dir': opts['pshf_dir'], 'speaker': args.speaker, 'batch_f0': args.batch_f0, 'rows': 'segments',
+					'staging': args.staging, 'tracker': args.tracker, 'stream': args.stream,
+					'rules': sorted([list(k) + list(r) for k, r in rules.table.items()])}
+		done = manifest.Manifest(output.script + ".manifest.json", settings)
+	with output:
+		for rows in runner.run_acquisitions(partial(process_acquisition, opts), wave_files, args.jobs,
+											done, profiler.run, outputs=True):
+			with profiler.stage("write"):
+				output.write_rows(rows)
+
+	with profiler.stage("pshf"):
+		failed = finish(args, [output])
+	profiler.report(args.profile or output.script + ".profile.json")
+	if failed:
+		sys.exit("{} PSHF job(s) failed".format(len(failed)))
@@ -0,0 +1,120 @@
+import os
+import threading
+
+'''
+Buffered, typed sink for result tables.
+
+Rows are collected in memory and written in batches, instead of reopening
+the output file for every row. The TSV format is the one the scripts have
+always written (measures rounded to 4 places); Parquet and Arrow IPC files
+keep typed columns (strings for subj, acq, phone..., float64 for measures)
+and need pyarrow, which is only imported when one of those formats is used.
+
+Worker processes return their rows to the parent (see sigmisc.runner), which
+is the only writer; write() is also safe to call from several threads.
+
+Usage:
+	columns = [("subj", str), ("acq", str), ("cog", float)]
+	with ResultsSink(output_path("S12_cogs.txt", fmt), columns, fmt) as sink:
+		sink.write(["S12", "2020-01-00", 5312.57])
+'''
+
+FORMATS = ["tsv", "parquet", "arrow"]
+EXTENSIONS = {"tsv": ".txt", "parquet": ".parquet", "arrow": ".arrow"}
+
+def output_path(path, fmt):
+	'''path with the extension for fmt (TSV paths are left as they are).'''
+	if fmt == "tsv":
+		return path
+	return os.path.splitext(path)[0] + EXTENSIONS[fmt]
+
+def format_value(val, kind):
+	if kind is float:
+		return str(round(val, 4))
+	return str(val)
+
+class ResultsSink(object):
+
+	def __init__(self, path, columns, fmt="tsv", batch_size=1000, header=True):
+		if fmt not in FORMATS:
+			raise ValueError("Unknown output format: {}".format(fmt))
+		self.path = path
+		self.names = [c[0] for c in columns]
+		self.kinds = [c[1] for c in columns]
+		self.fmt = fmt
+		self.batch_size = batch_size
+		self.rows = []
+		self.lock = threading.Lock()
+		self._writer = None
+		if fmt == "tsv":
+			self._out = open(path, "w")
+			if header:
+				self._out.write("\t".join(self.names) + "\n")
+		else:
+			import pyarrow as pa
+			self._pa = pa
+			self.schema = pa.schema([(n, pa.float64() if k is float else pa.string())
+									 for n, k in zip(self.names, self.kinds)])
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def write(self, row):
+		self.write_rows([row])
+
+	def write_rows(self, rows):
+		with self.lock:
+			self.rows.extend(rows)
+			if len(self.rows) >= self.batch_size:
+				self._flush()
+
+	def flush(self):
+		with self.lock:
+			self._flush()
+
+	def _flush(self):
+		rows, self.rows = self.rows, []
+		if not rows:
+			return
+		if self.fmt == "tsv":
+			self._out.write("".join("\t".join(format_value(v, k) for v, k in zip(row, self.kinds)) + "\n"
+									for row in rows))
+			return
+		pa = self._pa
+		arrays = []
+		for col, kind in enumerate(self.kinds):
+			if kind is float:
+				arrays.append(pa.array([float(row[col]) for row in rows], pa.float64()))
+			else:
+				arrays.append(pa.array([str(row[col]) for row in rows], pa.string()))
+		table = pa.Table.from_arrays(arrays, schema=self.schema)
+		if self._writer is None:
+			self._open_writer()
+		self._writer.write_table(table)
+
+	def _open_writer(self):
+		if self.fmt == "parquet":
+			import pyarrow.parquet as pq
+			self._writer = pq.ParquetWriter(self.path, self.schema)
+		else:
+			import pyarrow.ipc
+			self._writer = self._pa.ipc.new_file(self.path, self.schema)
+
+	def close(self):
+		with self.lock:
+			self._flush()
+			if self.fmt == "tsv":
+				self._out.close()
+			else:
+				if self._writer is None:
+					# no rows: still leave a valid, empty file
+					self._open_writer()
+				self._writer.close()
+
+def add_format_argument(parser):
+	parser.add_argument("--format", choices=FORMATS, default="tsv",
+						help="Output table format (parquet and arrow need pyarrow)"
+						)
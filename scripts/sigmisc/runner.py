@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sigmisc.manifest import acquisition_inputs
+
+'''
+Process-pool execution layer shared by the acquisition scripts.
+
+Each script wraps its per-acquisition work in a top-level function that
+returns the output rows for that acquisition; run() maps it over the
+acquisitions, in parallel if --jobs is greater than 1, and yields the
+results in task order. Output written from those results is therefore
+identical to a serial run no matter which worker finishes first.
+
+run_unordered() is for task lists too large, or too uneven, for that: tasks
+are handed out one at a time to whichever worker is free, and results come
+back as they finish, with the index of their task.
+
+run_acquisitions() is the loop the pipelines share: it runs their
+per-acquisition function with or without an incremental manifest and
+yields each acquisition's rows in order.
+'''
+
+def add_jobs_argument(parser):
+	parser.add_argument("-j", "--jobs", type=int, default=1,
+						help="Number of acquisitions to process in parallel \
+						(0 = one per CPU core)"
+						)
+
+def n_jobs(jobs):
+	if jobs is None or jobs < 0:
+		return 1
+	if jobs == 0:
+		return os.cpu_count() or 1
+	return jobs
+
+def run(func, tasks, jobs=1):
+	'''Apply func to every task and yield the results in task order.
+
+	func must be picklable (a module-level function, or a functools.partial
+	of one) when jobs > 1.
+	'''
+	tasks = list(tasks)
+	jobs = min(n_jobs(jobs), max(len(tasks), 1))
+	if jobs == 1:
+		for task in tasks:
+			yield func(task)
+		return
+	with ProcessPoolExecutor(max_workers=jobs) as pool:
+		for res in pool.map(func, tasks):
+			yield res
+
+def run_unordered(func, tasks, jobs=1):
+	'''Apply func to every task and yield (index, result) pairs as tasks finish.
+
+	Only a few tasks per worker are queued at a time, so a worker that is done
+	takes the next task rather than waiting behind a long one. Put the
+	longest tasks first to keep them from ending up last.
+	'''
+	tasks = list(tasks)
+	jobs = min(n_jobs(jobs), max(len(tasks), 1))
+	if jobs == 1:
+		for i, task in enumerate(tasks):
+			yield i, func(task)
+		return
+	queue = iter(enumerate(tasks))
+	with ProcessPoolExecutor(max_workers=jobs) as pool:
+		pending = {}
+		for i, task in queue:
+			pending[pool.submit(func, task)] = i
+			if len(pending) == 2 * jobs:
+				break
+		while pending:
+			finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+			for future in finished:
+				i = pending.pop(future)
+				for j, task in queue:
+					pending[pool.submit(func, task)] = j
+					break
+				yield i, future.result()
+
+def run_acquisitions(func, wave_files, jobs=1, manifest=None, run=run, outputs=False):
+	'''Yield the output rows of every acquisition in wave_files, in order.
+
+	With a manifest (--incremental), only acquisitions whose inputs changed
+	are run, then the stored rows of all acquisitions are yielded. If outputs
+	is True, func returns (rows, files written), and the files written by the
+	previous run of a changed acquisition are removed before it is rerun.
+	run is runner.run or a Profiler's run.
+	'''
+	if manifest is None:
+		for result in run(func, wave_files, jobs):
+			yield result[0] if outputs else result
+		return
+	with manifest:
+		manifest.prune(wave_files)
+		todo = [w for w in wave_files if not manifest.is_current(w, acquisition_inputs(w))]
+		print("Processing {} of {} acquisitions".format(len(todo), len(wave_files)))
+		if outputs:
+			for wave_file in todo:
+				manifest.remove_outputs(wave_file)
+		for wave_file, result in zip(todo, run(func, todo, jobs)):
+			rows, written = result if outputs else (result, [])
+			manifest.record(wave_file, acquisition_inputs(wave_file), rows, written)
+	for wave_file in wave_files:
+		if wave_file in manifest.entries:
+			yield manifest.rows(wave_file)
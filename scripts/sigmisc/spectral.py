@@ -0,0 +1,159 @@
+import numpy as np
+
+'''
+Vectorized spectral moments for fricative analysis.
+
+Praat's `Filter (stop Hann band)` works by taking the spectrum of a Sound,
+multiplying it by a Hann-shaped stop band and synthesizing it again; the
+centre of gravity and the other spectral moments are then weighted sums over
+the spectrum of the result. This module computes the spectrum of a segment
+once with NumPy, applies every stop band as a mask on that one spectrum and
+returns all moments for all bands in one array.
+
+By default the masked spectra are synthesized and truncated to the segment
+length in one batched inverse FFT, exactly as Praat does, which reproduces
+Praat's values to rounding error. With resynthesize=False the moments are
+taken straight from the masked spectrum; this skips the round trip but
+differs from Praat by the leakage of the truncated filter tails.
+
+Usage:
+	cutoffs = [0, 750, 2000, 3000, 4000, 5000]
+	cogs = band_moments(sub.values[0], sub.sampling_frequency, cutoffs)
+	# or several moments at once: shape (len(cutoffs), len(moments))
+	m = band_moments(values, fs, cutoffs, moments=("cog", "sd", "skew", "kurt"))
+
+A cutoff of 0 means no filtering (a plain `To Spectrum`).
+'''
+
+MOMENTS = ("cog", "sd", "skew", "kurt")
+
+def _mono(values):
+	values = np.asarray(values, dtype=float)
+	if values.ndim > 1:
+		values = values.mean(axis=0)
+	return values
+
+def _nfft(n):
+	nfft = 1
+	while nfft < n:
+		nfft *= 2
+	return nfft
+
+def praat_spectrum(values, fs):
+	'''Frequencies and energies of the spectrum Praat's `To Spectrum (fast)` produces.'''
+	values = _mono(values)
+	nfft = _nfft(len(values))
+	spec = np.fft.rfft(values, nfft) / fs
+	freqs = np.arange(len(spec)) * (fs / nfft)
+	return freqs, spec.real ** 2 + spec.imag ** 2
+
+def hann_stop_masks(freqs, cutoffs, smooth=100.):
+	'''Amplitude masks for a 0-to-cutoff Hann stop band, one row per cutoff.
+
+	Follows Praat's Spectrum_stopHannBand with fmin = 0, where Praat
+	applies no taper at the lower edge. A cutoff of 0 gives an all-pass row.
+	'''
+	freqs = np.asarray(freqs, dtype=float)
+	masks = np.ones((len(cutoffs), len(freqs)))
+	halfpi = np.pi / (2. * smooth) if smooth else 0.
+	for row, fmax in enumerate(cutoffs):
+		if not fmax or fmax <= 0:
+			continue
+		f3, f4 = fmax - smooth, fmax + smooth
+		masks[row, freqs <= f4] = 0.
+		if smooth:
+			taper = (freqs > f3) & (freqs <= f4)
+			masks[row, taper] = 0.5 - 0.5 * np.cos(halfpi * (freqs[taper] - f3))
+	return masks
+
+def moments_from_energy(freqs, energy, moments=("cog",), power=2.):
+	'''Spectral moments of one or more energy spectra (last axis is frequency).
+
+	Matches Praat's Spectrum: Get centre of gravity / standard deviation /
+	skewness / kurtosis with the given power.
+	'''
+	energy = np.atleast_2d(energy)
+	if power != 2.:
+		energy = energy ** (0.5 * power)
+	total = energy.sum(axis=-1)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		cog = (energy * freqs).sum(axis=-1) / total
+		dev = freqs[np.newaxis, :] - cog[:, np.newaxis]
+		out = []
+		for moment in moments:
+			if moment == "cog":
+				out.append(cog)
+			elif moment == "sd":
+				out.append(np.sqrt((energy * dev ** 2).sum(axis=-1) / total))
+			elif moment == "skew":
+				m2 = (energy * dev ** 2).sum(axis=-1) / total
+				m3 = (energy * dev ** 3).sum(axis=-1) / total
+				out.append(m3 / m2 ** 1.5)
+			elif moment == "kurt":
+				m2 = (energy * dev ** 2).sum(axis=-1) / total
+				m4 = (energy * dev ** 4).sum(axis=-1) / total
+				out.append(m4 / m2 ** 2 - 3.)
+			else:
+				raise ValueError("Unknown spectral moment: {}".format(moment))
+	return np.stack(out, axis=-1)
+
+def band_moments(values, fs, cutoffs, moments=("cog",), smooth=100., power=2., resynthesize=True):
+	'''Moments of a segment after each 0-to-cutoff Hann stop band.
+
+	Returns a 1-D array (one value per cutoff) if moments is ("cog",),
+	otherwise an array of shape (len(cutoffs), len(moments)).
+	'''
+	values = _mono(values)
+	n = len(values)
+	nfft = _nfft(n)
+	spec = np.fft.rfft(values, nfft)
+	freqs = np.arange(len(spec)) * (fs / nfft)
+	masks = hann_stop_masks(freqs, cutoffs, smooth)
+	if resynthesize:
+		# filtered sounds, cut back to the segment length, as Praat does
+		filtered = np.fft.irfft(spec * masks, nfft)[:, :n]
+		spec = np.fft.rfft(filtered, nfft)
+	else:
+		spec = spec * masks
+	spec = spec / fs
+	res = moments_from_energy(freqs, spec.real ** 2 + spec.imag ** 2, moments, power)
+	if tuple(moments) == ("cog",):
+		return res[:, 0]
+	return res
+
+def praat_band_moments(sound, cutoffs, moments=("cog",), smooth=100., power=2.):
+	'''Reference values computed with Praat, one filter pass per cutoff.'''
+	import parselmouth
+	calls = {"cog": "Get centre of gravity",
+			 "sd": "Get standard deviation",
+			 "skew": "Get skewness",
+			 "kurt": "Get kurtosis"}
+	res = np.empty((len(cutoffs), len(moments)))
+	for row, fmax in enumerate(cutoffs):
+		if fmax:
+			filt = parselmouth.praat.call(sound, "Filter (stop Hann band)", 0, fmax, smooth)
+		else:
+			filt = sound
+		spec = filt.to_spectrum()
+		for col, moment in enumerate(moments):
+			res[row, col] = parselmouth.praat.call(spec, calls[moment], power)
+	if tuple(moments) == ("cog",):
+		return res[:, 0]
+	return res
+
+# default relative tolerance for verify(); the batched round trip matches
+# Praat to about 1e-12, so this leaves room only for platform FFT differences
+VERIFY_RTOL = 1e-6
+
+def verify(sound, values, cutoffs, moments=("cog",), smooth=100., power=2., rtol=VERIFY_RTOL):
+	'''Check values from band_moments against Praat; raise if any differ by more than rtol.
+
+	rtol is relative to the Praat value. Returns the Praat values.
+	'''
+	ref = praat_band_moments(sound, cutoffs, moments, smooth, power)
+	values = np.asarray(values)
+	bad = ~np.isclose(values, ref, rtol=rtol, atol=0., equal_nan=True)
+	if np.any(bad):
+		raise ValueError("Spectral moments differ from Praat beyond rtol={}: {} vs. {}".format(
+			rtol, values[bad], ref[bad]))
+	return ref
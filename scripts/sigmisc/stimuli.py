@@ -0,0 +1,132 @@
+import numpy as np
+import parselmouth
+from sigmisc.profiling import stage
+
+'''
+Stimulus building: cut intervals at zero crossings, scale them to a common
+intensity and pad them with leading silence, as for perception experiments.
+
+A StimulusBuilder indexes the zero crossings of a sound once (from NumPy
+sign changes), so snapping any number of boundaries is one searchsorted
+call rather than a scan of the sound per boundary. The silence pad is one
+shared buffer, and all stimuli cut from a sound are scaled together. The
+results are the same as Praat's Get nearest zero crossing, Extract part
+(rectangular), Scale intensity and Concatenate.
+
+Usage:
+	builder = StimulusBuilder(sound)              # resampled acquisition
+	spans, stims = builder.build([(t1, t2), ...])   # snapped times, sample arrays
+	builder.save(stims, out_paths)
+'''
+
+# squared reference pressure (Pa^2) of Praat's intensity in dB
+P_REF2 = 4.0e-10
+
+_silence = {}
+
+def silence(duration, fs, channels=1):
+	'''Read-only buffer of zeros, shared by all callers asking for the same shape.'''
+	key = (duration, fs, channels)
+	if key not in _silence:
+		pad = np.zeros((channels, int(round(duration * fs))))
+		pad.flags.writeable = False
+		_silence[key] = pad
+	return _silence[key]
+
+def scale_intensity(segments, intensity=70.):
+	'''Scale each of segments (arrays of shape (channels, samples)) in place to intensity dB.
+
+	Segments without signal are left as they are, like Praat's Scale intensity.
+	'''
+	if not segments:
+		return segments
+	lengths = np.array([s.shape[1] for s in segments])
+	squares = np.concatenate([(s ** 2).sum(axis=0) for s in segments])
+	starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+	sum2 = np.add.reduceat(squares, starts)
+	n = lengths * segments[0].shape[0]
+	with np.errstate(divide="ignore"):
+		current = 10. * np.log10(sum2 / (n * P_REF2))
+	factors = np.where(sum2 > 0, 10. ** ((intensity - current) / 20.), 1.)
+	for s, f in zip(segments, factors):
+		s *= f
+	return segments
+
+class ZeroCrossings(object):
+	'''Zero crossings of one channel of a sampled signal.'''
+
+	def __init__(self, values, x1, dx):
+		self.x1 = x1
+		self.dx = dx
+		pos = values >= 0.
+		# sample k and k + 1 have different signs; crossing by linear interpolation
+		self.k = np.flatnonzero(pos[:-1] != pos[1:])
+		y1, y2 = values[self.k], values[self.k + 1]
+		xa = x1 + self.k * dx
+		xb = x1 + (self.k + 1) * dx
+		self.times = xa + (xb - xa) * y1 / (y1 - y2)
+
+	def nearest(self, times):
+		'''Nearest zero crossing to each of times (NaN if there is none).
+
+		As Praat's Get nearest zero crossing: a crossing between the samples
+		around t is taken if there is one, otherwise the closer of the nearest
+		crossings on either side.
+		'''
+		times = np.asarray(times, dtype=float)
+		low = np.floor((times - self.x1) / self.dx).astype(int)
+		n = len(self.k)
+		if n == 0:
+			return np.full(times.shape, np.nan)
+		j = np.searchsorted(self.k, low)
+		left = np.where(j > 0, self.times[np.maximum(j - 1, 0)], np.nan)
+		right = np.where(j < n, self.times[np.minimum(j, n - 1)], np.nan)
+		here = (j < n) & (self.k[np.minimum(j, n - 1)] == low)
+		use_left = np.isnan(right) | (times - left < right - times)
+		return np.where(here, right, np.where(use_left, left, right))
+
+class StimulusBuilder(object):
+
+	def __init__(self, sound, pad=0.02, intensity=70.):
+		self.sound = sound
+		self.values = sound.values
+		self.fs = sound.sampling_frequency
+		self.pad = pad
+		self.intensity = intensity
+		self._zc = None
+
+	@property
+	def zero_crossings(self):
+		if self._zc is None:
+			self._zc = ZeroCrossings(self.values[0], self.sound.x1, self.sound.dx)
+		return self._zc
+
+	def extract(self, t1, t2):
+		'''Copy of the samples Praat's Extract part (rectangular) takes for t1..t2.'''
+		x1, dx = self.sound.x1, self.sound.dx
+		i1 = max(int(np.ceil((t1 - x1) / dx)), 0)
+		i2 = min(int(np.floor((t2 - x1) / dx)), self.values.shape[1] - 1)
+		if i2 < i1:
+			raise ValueError("Extracted stimulus from {} to {} would contain no samples".format(t1, t2))
+		return self.values[:, i1:i2 + 1].copy()
+
+	def build(self, spans):
+		'''Snap (t1, t2) spans to zero crossings and build their padded, scaled stimuli.
+
+		Returns the snapped spans and the stimuli as (channels, samples) arrays.
+		'''
+		with stage("extract"):
+			times = self.zero_crossings.nearest([t for span in spans for t in span])
+			if np.any(np.isnan(times)):
+				raise ValueError("No zero crossing near a stimulus boundary")
+			snapped = list(zip(times[0::2], times[1::2]))
+			parts = scale_intensity([self.extract(t1, t2) for t1, t2 in snapped], self.intensity)
+			sil = silence(self.pad, self.fs, self.values.shape[0])
+			stims = [np.concatenate([sil, part], axis=1) for part in parts]
+		return snapped, stims
+
+	def save(self, stims, paths):
+		'''Write stimuli as WAV files, the way Praat saves a Sound.'''
+		with stage("write"):
+			for values, path in zip(stims, paths):
+				parselmouth.Sound(values, sampling_frequency=self.fs).save(path, "WAV")
@@ -0,0 +1,217 @@
+import os
+import re, glob
+from numpy import linspace
+import audiolabel
+from functools import partial
+from sigmisc.audiocache import AudioCache
+from sigmisc import spectral, runner, manifest, corpusindex, results, profiling
+from sigmisc.profiling import stage
+from sigmisc.intervals import IntervalIndex
+from sigmisc.labels import read_stimfile, skip_set, LabelRules, add_rules_argument
+from sigmisc.segments import WavSegments, add_stream_argument
+
+'''
+Spectral moments (CoG etc.) of fricatives and fricative vowels in the Suzhou
+ultrasound corpus: the suzhou-cog command, also run by suzhou-cog-process.py.
+
+Usage:
+	parser = argparse.ArgumentParser()
+	add_arguments(parser)
+	main(parser.parse_args(["S12", "--moments", "sd", "-j", "4"]))
+'''
+
+# stop-band cutoffs (0 = unfiltered) and their column suffixes
+cutoffs = [0, 750, 2000, 3000, 4000, 5000]
+band_names = ["", "075k", "2k", "3k", "4k", "5k"]
+
+# audio caches of each worker process by cache directory, set up on first use
+# (a corpus run hands a process the acquisitions of many subjects in turn)
+audio_caches = {}
+
+def get_audio_cache(opts):
+	cache_dir = opts['audio_cache']
+	if cache_dir not in audio_caches:
+		audio_caches[cache_dir] = AudioCache(cache_dir, opts['audio_cache_size'])
+	return audio_caches[cache_dir]
+
+def process_acquisition(opts, wave_file):
+	'''Measure all target phones in one acquisition and return its output rows.'''
+	rows = []
+	subj = opts['subj']
+	moments = opts['moments']
+
+	#print(wave_file)
+	parent = os.path.dirname(wave_file)
+	# skip over other acoustics folders
+	if parent.endswith("sauce"):
+		#print("Skipping sauce")
+		return rows
+	# skip landmark/practice trials
+	stimfile = os.path.join(parent,"stim.txt")
+	stim = read_stimfile(stimfile)
+	#print(stim)
+
+	if stim in skip_set:
+		return rows
+
+	# define other files of interest
+	acq = os.path.split(parent)[1]
+	tg_handle = os.path.join(parent,str(acq + ".ch1.TextGrid"))
+	wav = None
+
+	with stage("labels"):
+		tg = audiolabel.LabelManager(from_file=tg_handle,from_type='praat')
+		# look up the word at every phone's center in one pass
+		phones = list(tg.tier('phone'))
+		words = IntervalIndex(tg.tier('word')).labels_at([f.center for f in phones])
+
+	# relabel all phones at once; phones without a rule (not a target
+	# segment, or not in a target word) are skipped
+	for f, word, rule in zip(phones, words, opts['rules'].rewrite(phones, words)):
+		if rule is None or not rule.label:
+			continue
+		pron = word.text
+		f.text, coart_class, round_class = rule
+
+		print(acq, '\t', stim, '\t', 'Analyzing a {}, {}'.format(f.text, coart_class))
+
+		# do the Parselmouth stuff on middle third of selected file
+		if opts['stream']:
+			# only a padded window around this phone, resampled on its own
+			if wav is None:
+				wav = WavSegments(wave_file)
+			wv = wav.window(f.t1, f.t2, 44100)
+		else:
+			wv = get_audio_cache(opts).get(wave_file, 44100)
+
+		thirds = linspace(f.t1, f.t2, 4)
+		with stage("extract"):
+			sub = wv.extract_part(from_time = thirds[1], to_time = thirds[2], preserve_times=True)
+
+		# one spectrum for all stop bands (Hann, 100 Hz smoothing), rows are bands
+		with stage("spectrum"):
+			meas = spectral.band_moments(sub.values, sub.sampling_frequency, cutoffs, moments=moments)
+		if opts['verify']:
+			with stage("verify"):
+				spectral.verify(sub, meas, cutoffs, moments=moments)
+
+		# output the data in tabular format
+		out_row = [subj, acq, stim, pron, f.text, coart_class, round_class] + [float(m) for m in meas.T.ravel()]
+		# ('before', before),
+		# ('after', after),
+		rows.append(out_row)
+	return rows
+
+def subject_name(expdir):
+	return str("S" + re.sub("[^0-9]", "", expdir))
+
+def subject_file(subj):
+	return os.path.join("cogs_out", str(subj + "_cogs.txt"))
+
+def output_columns(moments):
+	'''Output table columns, as (name, kind), for the given spectral moments.'''
+	measure_cols = [m + b for m in moments for b in band_names]
+	return [(c, str) for c in ["subj","acq","stim","pron","phone","coart_class","round_class"]] + \
+		   [(c, float) for c in measure_cols]
+
+def subject_opts(args, expdir, subj, rules):
+	'''Options passed to process_acquisition for one subject.'''
+	# each acquisition is loaded and resampled once; resampled audio is kept on disk
+	# (--stream resamples windows of the file instead, and needs no cache)
+	if args.no_audio_cache or args.stream:
+		cache_dir = None
+	else:
+		cache_dir = args.audio_cache or str(os.path.normpath(expdir) + "_resampled")
+	return {'subj': subj,
+			'moments': ["cog"] + args.moments,
+			'rules': rules,
+			'audio_cache': cache_dir,
+			'audio_cache_size': int(args.audio_cache_size * 2**20),
+			'stream': args.stream,
+			'verify': args.verify}
+
+def find_acquisitions(expdir):
+	return sorted(glob.glob(os.path.join(expdir,"*","*.ch1.wav")))
+
+def subject_tasks(args, expdir, name=None):
+	'''Subject name, process_acquisition options and sorted acquisitions to process of expdir.
+
+	The subject is named after name (default: expdir); with --index, only
+	acquisitions with targets are processed.
+	'''
+	subj = subject_name(name or expdir)
+	rules = LabelRules.from_file(args.label_rules)
+	# only acquisitions with a target phone inside a target word
+	wave_files = corpusindex.select_from_args(args, expdir, find_acquisitions(expdir), lambda index: index.acquisitions_with(
+		phones=rules.phones(), words=rules.words(), skip_stims=skip_set))
+	return subj, subject_opts(args, expdir, subj, rules), wave_files
+
+def table_columns(args):
+	return output_columns(["cog"] + args.moments)
+
+def subject_output(args, expdir, subj):
+	'''Sink for the rows of one subject, cogs_out/[subj]_cogs.txt.'''
+	return results.ResultsSink(results.output_path(subject_file(subj), args.format), table_columns(args), args.format)
+
+def add_measure_arguments(parser):
+	'''Options of the measurements themselves (shared with the corpus command).'''
+	parser.add_argument("--audio-cache",
+						help="Directory for resampled audio kept between runs \
+						(default: [expdir]_resampled)"
+						)
+	parser.add_argument("--audio-cache-size", type=float, default=1024,
+						help="Maximum size of the resampled audio cache in MB"
+						)
+	parser.add_argument("--no-audio-cache", action="store_true",
+						help="Don't keep resampled audio on disk"
+						)
+	parser.add_argument("--moments", nargs="+", default=[],
+						choices=["sd", "skew", "kurt"],
+						help="Additional spectral moments to output for every band"
+						)
+	parser.add_argument("--verify", action="store_true",
+						help="Check all spectral moments against Praat's filter \
+						and spectrum (relative tolerance {})".format(spectral.VERIFY_RTOL)
+						)
+	add_rules_argument(parser)
+	add_stream_argument(parser)
+	results.add_format_argument(parser)
+	corpusindex.add_index_argument(parser)
+
+def add_arguments(parser):
+	parser.add_argument("expdir",
+						help="Experiment directory containing \
+						acquisitions in flat structure"
+						)
+	add_measure_arguments(parser)
+	manifest.add_incremental_argument(parser)
+	profiling.add_profile_argument(parser)
+	runner.add_jobs_argument(parser)
+
+def main(args):
+	expdir = args.expdir
+
+	# acquisitions are processed in sorted order; rows come back in that order
+	# whatever the number of jobs
+	subj, opts, wave_files = subject_tasks(args, expdir)
+	rules = opts['rules']
+	moments = opts['moments']
+
+	acoustic_file = subject_file(subj)
+	columns = table_columns(args)
+	out_file = results.output_path(acoustic_file, args.format)
+
+	profiler = profiling.Profiler(enabled=args.profile is not None)
+
+	done = None
+	if args.incremental:
+		# rerun only what changed, then rebuild the table from the manifest
+		settings = {'subj': subj, 'moments': moments, 'stream': args.stream, 'columns': [c[0] for c in columns],
+					'rules': sorted([list(k) + list(r) for k, r in rules.table.items()])}
+		done = manifest.Manifest(acoustic_file + ".manifest.json", settings)
+	with subject_output(args, expdir, subj) as sink:
+		for rows in runner.run_acquisitions(partial(process_acquisition, opts), wave_files, args.jobs,
+											done, profiler.run):
+			with profiler.stage("write"):
+				sink.write_rows(rows)
+	profiler.report(args.profile or out_file + ".profile.json")
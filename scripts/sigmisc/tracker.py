@@ -0,0 +1,173 @@
+import numpy as np
+import parselmouth
+from parselmouth.praat import call
+from sigmisc import ifc, results
+from sigmisc.profiling import stage
+
+'''
+Formant and f0 tracks from ifcformant or, in process, from Praat.
+
+The praat tracker runs Praat's To Formant (burg) and To Pitch through
+parselmouth on a Sound already in memory, and returns the same structured
+array layout as ifcformant (sec, rms, f0, f1, f2, f3): no subprocess, no
+temporary WAV or output file and no table to parse. f0 is 0 in unvoiced
+frames, as ifcformant prints it; formants Praat finds no value for are NaN.
+Its values are not ifcformant's, so the compare command reports how far the
+two trackers are apart on a set of WAV files before switching a study over.
+
+Usage:
+	track = get_track(wave_file, 'female', tracker='praat', sound=sound)
+	python -m sigmisc track-compare [wave files] --speaker female [-o report.txt]
+'''
+
+TRACKERS = ["ifcformant", "praat"]
+
+# frame step and analysis window of the praat tracker (s)
+TIME_STEP = 0.005
+WINDOW = 0.025
+
+# Praat settings per ifcformant --speaker: maximum formant (Hz), pitch floor and ceiling (Hz)
+SPEAKERS = {
+	'female': (5500., 100., 500.),
+	'male': (5000., 75., 300.),
+	'child': (8000., 150., 600.),
+}
+
+FIELDS = ["sec", "rms", "f0", "f1", "f2", "f3"]
+
+def praat_track(sound, speaker, time_step=TIME_STEP):
+	'''Track rms, f0 and F1-F3 of sound with Praat, in ifcformant's layout.'''
+	max_formant, pitch_floor, pitch_ceiling = SPEAKERS[speaker]
+	try:
+		with stage("formant"):
+			formant = sound.to_formant_burg(time_step=time_step, max_number_of_formants=5,
+											maximum_formant=max_formant, window_length=WINDOW)
+	except parselmouth.PraatError:
+		# too short to analyse
+		return np.empty(0, dtype=[(n, float) for n in FIELDS])
+	track = np.empty(formant.nx, dtype=[(n, float) for n in FIELDS])
+	track['sec'] = formant.xs()
+	with stage("formant"):
+		for n in range(1, 4):
+			values = call(formant, "To Matrix", n).values[0]
+			track['f{}'.format(n)] = np.where(values > 0, values, np.nan)
+
+	# f0 of the pitch frame nearest each formant frame; 0 where unvoiced,
+	# or if the sound is too short for the pitch floor
+	track['f0'] = 0.
+	try:
+		with stage("pitch"):
+			pitch = sound.to_pitch(time_step=time_step, pitch_floor=pitch_floor, pitch_ceiling=pitch_ceiling)
+	except parselmouth.PraatError:
+		pitch = None
+	if pitch is not None and pitch.nx:
+		f0 = pitch.selected_array['frequency']
+		k = np.rint((track['sec'] - pitch.x1) / pitch.dx).astype(int)
+		inside = (k >= 0) & (k < pitch.nx)
+		track['f0'][inside] = f0[k[inside]]
+
+	# rms of the first channel over the analysis window of each frame
+	values = sound.values[0]
+	csum = np.concatenate([[0.], np.cumsum(values ** 2)])
+	half = WINDOW / 2.
+	lo = np.clip(np.rint((track['sec'] - half - sound.x1) / sound.dx).astype(int), 0, len(values))
+	hi = np.clip(np.rint((track['sec'] + half - sound.x1) / sound.dx).astype(int) + 1, 0, len(values))
+	with np.errstate(invalid="ignore"):
+		track['rms'] = np.sqrt((csum[hi] - csum[lo]) / (hi - lo))
+	return track
+
+def get_track(wave_file, speaker, tracker="ifcformant", cache=None, sound=None):
+	'''Track wave_file with tracker. The praat tracker uses sound instead of the file if given.'''
+	if tracker == "ifcformant":
+		return ifc.run_ifcformant(wave_file, speaker, cache=cache)
+	if sound is None:
+		with stage("load"):
+			sound = parselmouth.Sound(wave_file)
+	return praat_track(sound, speaker)
+
+def get_tracks(wave_files, speaker, tracker="ifcformant", max_workers=4, cache=None, sounds=None):
+	'''Tracks of each of wave_files, in order (ifcformant runs max_workers at a time).'''
+	if tracker == "ifcformant":
+		return ifc.run_many(wave_files, speaker, max_workers, cache=cache)
+	sounds = sounds or [None] * len(wave_files)
+	return [get_track(w, speaker, tracker, sound=s) for w, s in zip(wave_files, sounds)]
+
+def add_tracker_argument(parser):
+	parser.add_argument("--tracker", choices=TRACKERS, default="ifcformant",
+						help="Formant and f0 tracker: the ifcformant program, or Praat \
+						run in process (see python -m sigmisc track-compare)"
+						)
+
+def compare(reference, track):
+	'''Differences of track from reference, at the reference frames.
+
+	Returns {column: (frames compared, mean absolute error, RMS error)} for
+	f0 (frames voiced in both) and f1-f3 (frames with both values), and the
+	proportion of reference frames whose voicing the two tracks agree on.
+	'''
+	stats = {}
+	if len(reference) == 0 or len(track) == 0:
+		return stats, np.nan
+	# nearest frame of track to each reference frame
+	sec = track['sec']
+	k = np.clip(np.searchsorted(sec, reference['sec']), 0, len(sec) - 1)
+	prev = np.maximum(k - 1, 0)
+	k = np.where(np.abs(reference['sec'] - sec[prev]) < np.abs(sec[k] - reference['sec']), prev, k)
+	for col in ["f0", "f1", "f2", "f3"]:
+		ref, val = reference[col], track[col][k]
+		ok = np.isfinite(ref) & np.isfinite(val)
+		if col == "f0":
+			ok &= (ref > 0) & (val > 0)
+		err = val[ok] - ref[ok]
+		if len(err):
+			stats[col] = (len(err), float(np.abs(err).mean()), float(np.sqrt((err ** 2).mean())))
+		else:
+			stats[col] = (0, np.nan, np.nan)
+	voicing = float(np.mean((reference['f0'] > 0) == (track['f0'][k] > 0)))
+	return stats, voicing
+
+def add_arguments(parser):
+	parser.add_argument("wave_files", nargs="+",
+						help="WAV files to track with both trackers"
+						)
+	parser.add_argument("--speaker", default="female", choices=sorted(SPEAKERS),
+						help="ifcformant speaker setting (and the matching Praat settings)"
+						)
+	parser.add_argument("-o", "--output",
+						help="Also write the per-file report to this table"
+						)
+	results.add_format_argument(parser)
+
+def main(args):
+	cols = ["f0", "f1", "f2", "f3"]
+	columns = [("file", str), ("frames", str), ("voicing_agreement", float)] + \
+			  [(c + suffix, kind) for c in cols for suffix, kind in [("_n", str), ("_mae", float), ("_rmse", float)]]
+	rows = []
+	totals = dict((c, [0, 0., 0.]) for c in cols)
+	for wave_file in args.wave_files:
+		reference = ifc.run_ifcformant(wave_file, args.speaker)
+		stats, voicing = compare(reference, praat_track(parselmouth.Sound(wave_file), args.speaker))
+		row = [wave_file, str(len(reference)), voicing]
+		for c in cols:
+			n, mae, rmse = stats.get(c, (0, np.nan, np.nan))
+			row.extend([str(n), mae, rmse])
+			if n:
+				totals[c][0] += n
+				totals[c][1] += n * mae
+				totals[c][2] += n * rmse ** 2
+		rows.append(row)
+	print("praat tracker against ifcformant, {} files ({} speaker settings)".format(
+		len(args.wave_files), args.speaker))
+	print("{:<6}{:>10}{:>12}{:>12}".format("", "frames", "MAE (Hz)", "RMSE (Hz)"))
+	for c in cols:
+		n, abs_sum, sq_sum = totals[c]
+		if n:
+			print("{:<6}{:>10}{:>12.1f}{:>12.1f}".format(c, n, abs_sum / n, np.sqrt(sq_sum / n)))
+		else:
+			print("{:<6}{:>10}{:>12}{:>12}".format(c, 0, "NA", "NA"))
+	voicing = [r[2] for r in rows if np.isfinite(r[2])]
+	if voicing:
+		print("voicing agreement: {:.1%} of frames (mean over files)".format(np.mean(voicing)))
+	if args.output:
+		with results.ResultsSink(results.output_path(args.output, args.format), columns, args.format) as sink:
+			sink.write_rows(rows)